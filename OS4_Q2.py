@@ -3,7 +3,6 @@
 
 from designs import *
 from transport import *
-from copy import deepcopy
 import csv
 import time
 import math
@@ -81,18 +80,11 @@ if __name__ == "__main__":  # Necessary for multiprocessing
             ride_time = random.uniform(i * interval, (i + 1) * interval)
             rides.append(Ride(DISTANCE(), PASSENGERS(), ride_time))
 
-    rides = sorted(rides, key=lambda x: x.start_time)
-
-    def copy_rides(rides):
-        """Create a deep copy."""
-        result: list[Ride] = [None] * len(rides)
-        for i, r in enumerate(rides):
-            result[i] = deepcopy(r)
-        return result
+    rides = RideTable.from_rides(sorted(rides, key=lambda x: x.start_time))
 
     # Run the simulation
     start_time = time.time()
-    results = list(map(sim.run, [(f, copy_rides(rides)) for f in fleets]))
+    results = list(map(sim.run, [(f, rides) for f in fleets]))
     elapsed = time.time() - start_time
     print(f"Compute time: {elapsed / 60:.3f} minutes")
     print(f"Results: {len(results)}")
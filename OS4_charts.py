@@ -1,7 +1,6 @@
 # Robaire Galliath
 # EM 411, Fall 2024
 
-import ast
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -9,6 +8,8 @@ from matplotlib.lines import Line2D
 from matplotlib.colors import to_rgb
 import matplotlib.colors as mcolors
 import matplotlib.patches as mpatches
+from results import load_frame
+from pareto import is_pareto
 
 SINGLES = "./Q4/singles.csv"
 PAIRS = "./Q4/pairs.csv"
@@ -18,29 +19,14 @@ MAX_COST = 1_000_000
 
 results = []
 for s in [SINGLES, PAIRS, REFERENCE, POINTS]:
-    data = pd.read_csv(s)
+    data = load_frame(s)  # .csv or .npz
     data = data.loc[data["fleet_cost"] < MAX_COST]
-    data["vehicles"] = data["vehicles"].apply(ast.literal_eval)
-    data["vehicle_quantities"] = data["vehicle_quantities"].apply(ast.literal_eval)
-    data["vehicle_costs"] = data["vehicle_costs"].apply(ast.literal_eval)
-    data["vehicle_ranges"] = data["vehicle_ranges"].apply(ast.literal_eval)
-    data["vehicle_speeds"] = data["vehicle_speeds"].apply(ast.literal_eval)
-    data["fleet_size"] = data["vehicle_quantities"].apply(sum)
     results.append(data)
 
 data = pd.concat(results)
 
 
-# Isolate pareto front
-def is_pareto(utility):
-    """Assumes the input is sorted by cost."""
-    is_efficient = np.ones(utility.shape[0], dtype=bool)
-    for i, u in enumerate(utility):
-        is_efficient[i] = not np.any(utility[:i] >= u)
-    return is_efficient
-
-
-# Sort entries by cost
+# Isolate pareto front, sorting entries by cost
 data = data.sort_values("fleet_cost")
 pareto = data.loc[is_pareto(data["utility"])]
 
@@ -50,7 +36,7 @@ reference = results[2]
 points = results[3]
 
 # Classify into Bikes and Cars
-singles["class"] = singles["vehicles"].apply(lambda x: x[0][0])
+singles["class"] = singles["vehicles_0"].str[0]
 bikes = singles.loc[singles["class"] == "B"]
 cars = singles.loc[singles["class"] == "C"]
 
@@ -0,0 +1,112 @@
+# Robaire Galliath
+# EM 411, Fall 2024
+
+import em411
+from designs import *
+from transport import *
+import transport
+import dataclasses
+import math
+import random
+import time
+import tracemalloc
+
+#######################################################
+# Slotted vs dict-backed classes on a Q4 pairs sweep #
+#######################################################
+
+# Compares the memory per instance and the simulation time of the slotted
+# component, Ride, and RealVehicle classes against dict-backed copies.
+
+SAMPLES = 10_000  # Instances allocated to measure memory
+FLEETS = 200  # Fleets simulated to measure time
+
+
+def unslotted(cls):
+    """Return a dict-backed copy of a slotted class."""
+    skip = set(cls.__slots__) | {"__slots__", "__dict__", "__weakref__"}
+    namespace = {k: v for k, v in vars(cls).items() if k not in skip}
+    return type(cls.__name__, cls.__bases__, namespace)
+
+
+def instance_size(factory):
+    """Return the memory allocated per instance [bytes]."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    instances = [factory() for _ in range(SAMPLES)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del instances
+    return (after - before) / SAMPLES
+
+
+if __name__ == "__main__":
+
+    scenario = em411.load_scenario("scenarios/q4.toml")
+    sim = scenario.sim
+    table = scenario.rides()
+    pairs = next(s for s in scenario.sweeps if s.name == "pairs")
+    fleets = list(em411.fleets(pairs, scenario.cost_cap))
+
+    # Instances created over the sweep: each task unpickles its own fleet
+    counts = {
+        "Chassis": 2 * len(fleets),
+        "Battery": 2 * len(fleets),
+        "Charger": 2 * len(fleets),
+        "Motor": 2 * len(fleets),
+        "Autonomy": 2 * len(fleets),
+        "Ride": len(table),
+        "RealVehicle": sum(sum(f.quantities) for f in fleets),
+    }
+
+    bike, car = fleets[0].vehicles
+    factories = {
+        "Chassis": lambda cls: cls(*dataclasses.astuple(car.chassis)),
+        "Battery": lambda cls: cls(*dataclasses.astuple(car.battery)),
+        "Charger": lambda cls: cls(*dataclasses.astuple(car.charger)),
+        "Motor": lambda cls: cls(*dataclasses.astuple(car.motor)),
+        "Autonomy": lambda cls: cls(*dataclasses.astuple(car.autonomy)),
+        "Ride": lambda cls: cls(1.5, 2, random.random()),
+        "RealVehicle": lambda cls: cls(car),
+    }
+    classes = {
+        "Chassis": Chassis,
+        "Battery": Battery,
+        "Charger": Charger,
+        "Motor": Motor,
+        "Autonomy": Autonomy,
+        "Ride": Ride,
+        "RealVehicle": RealVehicle,
+    }
+
+    print(f"Pairs sweep: {len(fleets)} fleets")
+    print(
+        f"{'Class':<12} {'Count':>10} {'Dict [B]':>10} {'Slots [B]':>10} {'Saved [MB]':>11}"
+    )
+    saved = 0
+    for name, cls in classes.items():
+        plain_cls = unslotted(cls)
+        slotted = instance_size(lambda: factories[name](cls))
+        plain = instance_size(lambda: factories[name](plain_cls))
+        total = (plain - slotted) * counts[name] / 1e6
+        saved += total
+        print(
+            f"{name:<12} {counts[name]:>10} {plain:>10.0f} {slotted:>10.0f} {total:>11.1f}"
+        )
+    print(f"Total saved over the sweep: {saved:.1f} MB")
+
+    # Simulation time with slotted and dict-backed vehicle state, best of three
+    sample = fleets[:: max(len(fleets) // FLEETS, 1)][:FLEETS]
+    variants = {"Dict": unslotted(RealVehicle), "Slots": RealVehicle}
+    best = {label: math.inf for label in variants}
+    for _ in range(3):
+        for label, cls in variants.items():
+            transport.RealVehicle = cls
+            start_time = time.perf_counter()
+            for f in sample:
+                sim.run((f, table))
+            best[label] = min(best[label], time.perf_counter() - start_time)
+    transport.RealVehicle = RealVehicle
+
+    for label, elapsed in best.items():
+        print(f"{label}: {elapsed / len(sample) * 1000:.3f} ms per fleet")
@@ -0,0 +1,142 @@
+# Robaire Galliath
+# EM 411, Fall 2024
+
+from dataclasses import dataclass
+from transport import Ride, RideTable
+import hashlib
+import numpy as np
+import random
+
+###############################
+# Vectorized Demand Scenarios #
+###############################
+
+# Ride requests drawn in bulk with numpy.random.Generator instead of one
+# random call per ride. Distributions are small specs that sample n values
+# at once, so a mixture only draws each ride from the component it uses.
+# Each spec can also draw a single value with the random module, in the
+# same order as the original scripts, so seeded scenarios reproduce.
+
+
+@dataclass(frozen=True, slots=True)
+class Normal:
+    mean: float
+    std: float
+
+    def sample(self, rng: np.random.Generator, n):
+        return rng.normal(self.mean, self.std, n)
+
+    def draw(self, rnd: random.Random):
+        return rnd.gauss(self.mean, self.std)
+
+
+@dataclass(frozen=True, slots=True)
+class LogNormal:
+    mu: float  # Mean of the underlying normal, as random.lognormvariate
+    sigma: float  # Std-dev of the underlying normal
+
+    def sample(self, rng: np.random.Generator, n):
+        return rng.lognormal(self.mu, self.sigma, n)
+
+    def draw(self, rnd: random.Random):
+        return rnd.lognormvariate(self.mu, self.sigma)
+
+
+@dataclass(frozen=True, slots=True)
+class Rounded:
+    """Rounds another distribution to whole numbers of at least `minimum`."""
+
+    distribution: object
+    minimum: int = 1
+
+    def sample(self, rng: np.random.Generator, n):
+        values = np.round(self.distribution.sample(rng, n))
+        return np.maximum(values, self.minimum)
+
+    def draw(self, rnd: random.Random):
+        return max(round(self.distribution.draw(rnd)), self.minimum)
+
+
+@dataclass(frozen=True, slots=True)
+class Mixture:
+    """Draws each value from one component, chosen with the given weights."""
+
+    components: tuple
+    weights: tuple
+
+    def sample(self, rng: np.random.Generator, n):
+        p = np.asarray(self.weights, dtype=float)
+        choice = rng.choice(len(self.components), size=n, p=p / p.sum())
+        values = np.empty(n)
+        for i, component in enumerate(self.components):
+            mask = choice == i
+            values[mask] = component.sample(rng, np.count_nonzero(mask))
+        return values
+
+    def draw(self, rnd: random.Random):
+        # Every component is drawn, as random.choices needs the values
+        values = [c.draw(rnd) for c in self.components]
+        return rnd.choices(values, weights=self.weights, k=1)[0]
+
+
+SPECS = {
+    "normal": Normal,
+    "lognormal": LogNormal,
+    "rounded": Rounded,
+    "mixture": Mixture,
+}
+
+
+def spec(table: dict):
+    """Return a distribution spec from a table such as
+    {"type": "normal", "mean": 1.5, "std": 0.4}."""
+    table = dict(table)
+    kind = table.pop("type")
+    if kind not in SPECS:
+        raise ValueError(f"Unknown distribution type: {kind}")
+    if "distribution" in table:
+        table["distribution"] = spec(table["distribution"])
+    if "components" in table:
+        table["components"] = tuple(spec(c) for c in table["components"])
+        table["weights"] = tuple(table["weights"])
+    return SPECS[kind](**table)
+
+
+def generator(seed):
+    """Return a numpy Generator, hashing string seeds to integers."""
+    if isinstance(seed, str):
+        seed = int.from_bytes(hashlib.sha256(seed.encode()).digest()[:8], "little")
+    return np.random.default_rng(seed)
+
+
+def generate(counts, distance, passengers, seed=None, days=1):
+    """Return a RideTable of ride requests sorted by start time.
+
+    `counts` is the number of requests in each evenly spaced interval of a
+    24 hour day, repeated for `days` days. Start times are uniform within
+    each interval; distances and passenger counts are drawn from the given
+    distribution specs.
+    """
+    rng = generator(seed)
+    counts = np.tile(np.asarray(counts, dtype=np.int64), days)
+    interval = 24 / (len(counts) // days)
+
+    n = int(counts.sum())
+    start_time = (np.repeat(np.arange(len(counts)), counts) + rng.random(n)) * interval
+    start_time.sort()
+    return RideTable(
+        distance.sample(rng, n), passengers.sample(rng, n).astype(int), start_time
+    )
+
+
+def generate_random(counts, distance, passengers, seed=None):
+    """Return a RideTable like `generate`, drawing one ride at a time with
+    the random module in the order used by the original scripts."""
+    rnd = random.Random(seed)
+    rides: list[Ride] = []
+    interval = 24 / len(counts)
+    for i, count in enumerate(counts):
+        for _ in range(count):
+            ride_time = rnd.uniform(i * interval, (i + 1) * interval)
+            rides.append(Ride(distance.draw(rnd), passengers.draw(rnd), ride_time))
+    return RideTable.from_rides(sorted(rides, key=lambda x: x.start_time))
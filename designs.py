@@ -1,4 +1,7 @@
 from vehicle import *
+from dataclasses import fields
+import itertools
+import numpy as np
 
 ####################
 # Car Design Options
@@ -91,3 +94,85 @@ def bike_design(configuration):
         bike_chargers[design[2]],
         bike_motors[design[3]],
     )
+
+
+def design(configuration):
+    """Return a Bicycle or RoadVehicle given a configuration string."""
+    if configuration.startswith("B"):
+        return bike_design(configuration)
+    return car_design(configuration)
+
+
+BIKE_OPTIONS = [bike_frames, bike_batteries, bike_chargers, bike_motors]
+CAR_OPTIONS = [car_chassis, car_batteries, car_chargers, car_motors, car_autonomy]
+
+
+def configurations(options, exclude=()):
+    """Yield every valid configuration string built from the options, leaving
+    out the excluded component keys."""
+    keys = [[k for k in o if k not in exclude] for o in options]
+    for parts in itertools.product(*keys):
+        try:
+            design("".join(parts))
+        except ValueError:
+            continue
+        yield "".join(parts)
+
+
+def _gather(options, index):
+    """Return a component whose fields are arrays of the options at index."""
+    components = list(options.values())
+    columns = [
+        np.array([getattr(c, f.name) for c in components])[index]
+        for f in fields(components[0])
+    ]
+    return type(components[0])(*columns)
+
+
+def car_space():
+    """Return catalogue indices (chassis, battery, charger, motor, autonomy) of
+    every car design."""
+    shape = (
+        len(car_chassis),
+        len(car_batteries),
+        len(car_chargers),
+        len(car_motors),
+        len(car_autonomy),
+    )
+    return tuple(np.indices(shape).reshape(len(shape), -1))
+
+
+def bike_space():
+    """Return catalogue indices (frame, battery, charger, motor) of every bike
+    design."""
+    shape = (
+        len(bike_frames),
+        len(bike_batteries),
+        len(bike_chargers),
+        len(bike_motors),
+    )
+    return tuple(np.indices(shape).reshape(len(shape), -1))
+
+
+def car_batch(chassis, battery, charger, motor, autonomy):
+    """Return a VehicleBatch of cars given arrays of catalogue indices."""
+    return VehicleBatch(
+        RoadVehicle,
+        _gather(car_chassis, chassis),
+        _gather(car_batteries, battery),
+        _gather(car_chargers, charger),
+        _gather(car_motors, motor),
+        _gather(car_autonomy, autonomy),
+    )
+
+
+def bike_batch(frame, battery, charger, motor):
+    """Return a VehicleBatch of bikes given arrays of catalogue indices."""
+    return VehicleBatch(
+        Bicycle,
+        _gather(bike_frames, frame),
+        _gather(bike_batteries, battery),
+        _gather(bike_chargers, charger),
+        _gather(bike_motors, motor),
+        Autonomy("default", "4", 0, 0, 0),
+    )
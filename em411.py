@@ -0,0 +1,474 @@
+# Robaire Galliath
+# EM 411, Fall 2024
+
+from dataclasses import dataclass
+from demand import generate, generate_random, spec
+from designs import *
+from instrument import SweepProfile, write_report
+from multiprocessing import Pool
+from kernel import NUMBA, KernelSimulation
+from optimize import NSGA2, catalogue
+from prescreen import Prescreen
+from replicate import install_replicas
+from replicate import replicate as replicate_fleets
+from results import ResultWriter, open_results, scenario_hash
+from search import search as trace_curves
+from tracing import Trace, TraceRecorder
+from transport import (
+    EventSimulation,
+    RideTable,
+    Simulation,
+    install_scenario,
+    run_fleet,
+    run_fleet_timed,
+    run_variants,
+    run_variants_timed,
+    window_variants,
+)
+import argparse
+import dataclasses
+import itertools
+import math
+import os
+import time
+import tomllib
+
+###############################################
+# Command Line Sweeps of Scenario Definitions #
+###############################################
+
+# Usage: python -m em411 sweep scenarios/q3.toml [--workers 16] [--format csv]
+#
+# A scenario file declares the demand, its distributions, the simulation
+# constants, reference fleets, and the sweeps to run over the catalogue. See
+# scenarios/ for the Q2-Q4 scenarios.
+#
+# Usage: python -m em411 search scenarios/q3.toml [--tolerance 0.01]
+#        python -m em411 optimize scenarios/q3.toml [--generations 30]
+#        python -m em411 replicate scenarios/q3.toml [--replications 10]
+#
+# Trace each design of the singles sweeps by adaptive quantity search, search
+# mixed fleets of the full catalogue with NSGA-II, or replicate the reference
+# fleets over independently seeded demand scenarios.
+#
+# Usage: python -m em411 trace scenarios/q3.toml B1E1G2K3:60 C1P1G1M2A3:8
+#
+# Simulates one fleet and records every assignment, drop, and charge to a
+# trace file that tracing.Trace reads back.
+
+
+@dataclass
+class Sweep:
+    name: str  # Output file name, without extension
+    kind: str  # "singles" or "pairs"
+    bikes: range  # Bike quantities
+    cars: range  # Car quantities
+    exclude_bikes: list[str]  # Bike component keys left out of the catalogue
+    exclude_cars: list[str]  # Car component keys left out of the catalogue
+
+
+@dataclass
+class Scenario:
+    name: str
+    seed: str
+    sim: Simulation
+    counts: list[int]  # Ride requests in each evenly spaced interval of a day
+    distance: object  # Distribution spec [km]
+    passengers: object  # Distribution spec
+    generator: str  # "random" reproduces the original scripts, or "numpy"
+    cost_cap: float  # [$]
+    references: list[Fleet]
+    sweeps: list[Sweep]
+
+    def rides(self, seed=None) -> RideTable:
+        """Return the scenario's ride requests, drawn with another seed if
+        given."""
+        seed = self.seed if seed is None else seed
+        if self.generator == "numpy":
+            return generate(self.counts, self.distance, self.passengers, seed)
+        return generate_random(self.counts, self.distance, self.passengers, seed)
+
+
+def _quantities(bounds):
+    """Return the range of [start, stop, step] quantities, stop included."""
+    start, stop, step = bounds
+    return range(start, stop + 1, step)
+
+
+def load_scenario(path) -> Scenario:
+    """Return the Scenario declared in a TOML file."""
+    with open(path, "rb") as f:
+        data = tomllib.load(f)
+
+    demand = data["demand"]
+    repeat = demand.get("repeat", 1)
+    constants = (
+        data["max_wait"] / 60,
+        data["availability"],
+        data["dwell_time"] / 60,
+        data["charge_distance"],
+        data["charge_time_penalty"] / 60,
+    )
+    if "chargers" in data:
+        # Hub chargers are limited, so vehicles may queue to charge
+        sim = EventSimulation(*constants, data["chargers"])
+    else:
+        sim = Simulation(*constants)
+    return Scenario(
+        data.get("name", os.path.splitext(os.path.basename(path))[0]),
+        data.get("seed", "EM411"),
+        sim,
+        [math.ceil(d) for d in demand["profile"] for _ in range(repeat)],
+        spec(demand["distance"]),
+        spec(demand["passengers"]),
+        demand.get("generator", "random"),
+        data.get("cost_cap", math.inf),
+        [
+            Fleet([design(d) for d in r["designs"]], r["quantities"])
+            for r in data.get("references", [])
+        ],
+        [
+            Sweep(
+                s["name"],
+                s["kind"],
+                _quantities(s.get("bikes", [40, 100, 10])),
+                _quantities(s.get("cars", [8, 20, 2])),
+                s.get("exclude_bikes", []),
+                s.get("exclude_cars", []),
+            )
+            for s in data.get("sweeps", [])
+        ],
+    )
+
+
+def vehicles(options, exclude):
+    """Yield every valid vehicle built from the options not excluded."""
+    for configuration in configurations(options, exclude):
+        yield design(configuration)
+
+
+def fleets(sweep: Sweep, cost_cap=math.inf):
+    """Yield the fleets of a sweep within the cost cap."""
+    bikes = itertools.product(vehicles(BIKE_OPTIONS, sweep.exclude_bikes), sweep.bikes)
+    cars = itertools.product(vehicles(CAR_OPTIONS, sweep.exclude_cars), sweep.cars)
+
+    if sweep.kind == "singles":
+        candidates = (Fleet([v], [q]) for v, q in itertools.chain(bikes, cars))
+    elif sweep.kind == "pairs":
+        # Each design pair's quantity variants are adjacent, so
+        # window_variants batches them together
+        candidates = (
+            Fleet([b, c], [qb, qc])
+            for b, c in itertools.product(
+                vehicles(BIKE_OPTIONS, sweep.exclude_bikes),
+                list(vehicles(CAR_OPTIONS, sweep.exclude_cars)),
+            )
+            for qb, qc in itertools.product(sweep.bikes, sweep.cars)
+        )
+    else:
+        raise ValueError(f"Unknown sweep kind: {sweep.kind}")
+
+    for fleet in candidates:
+        if fleet.cost() <= cost_cap:
+            yield fleet
+
+
+def simulator(scenario: Scenario, kernel=False):
+    """Return the scenario's simulator, or the compiled kernel if asked."""
+    sim = scenario.sim
+    if not kernel:
+        return sim
+    if type(sim) is not Simulation:
+        print(f"The kernel cannot replace {type(sim).__name__}, ignoring --kernel")
+    elif not NUMBA:
+        # Uncompiled, the kernel is slower than Simulation.run
+        print("numba is not installed, ignoring --kernel")
+    else:
+        sim = KernelSimulation(**dataclasses.asdict(sim))
+    return sim
+
+
+def sweep(args):
+    """Run the references and sweeps of a scenario file."""
+    scenario = load_scenario(args.scenario)
+    sim = simulator(scenario, args.kernel)
+    batch = args.batch and isinstance(sim, KernelSimulation)
+    if args.batch and not batch:
+        print("Batches need the kernel, ignoring --batch")
+    clock = time.perf_counter()
+    rides = scenario.rides()
+    report = {
+        "scenario": scenario.name,
+        "rides": len(rides),
+        "workers": args.workers,
+        "generate": time.perf_counter() - clock,
+        "sweeps": [],
+    }
+    key = scenario_hash(sim, rides)  # Identifies results when resuming
+    os.makedirs(args.output, exist_ok=True)
+    print(f"Scenario {scenario.name}: {len(rides)} ride requests")
+
+    if scenario.references:
+        results = [sim.run((f, rides)) for f in scenario.references]
+        with ResultWriter(os.path.join(args.output, "references.csv")) as writer:
+            for r in results:
+                writer.write(r)
+        print(f"References: {len(results)}")
+
+    for s in scenario.sweeps:
+        if args.only and s.name not in args.only:
+            continue
+
+        start_time = time.time()
+        profile = SweepProfile(s.name)
+        screen = Prescreen(sim, rides)
+        path = os.path.join(args.output, f"{s.name}.{args.format}")
+        with open_results(path, key) as writer:
+            screen.seed(*writer.stored())
+            pending = (f for f in fleets(s, scenario.cost_cap) if not writer.done(f))
+            with Pool(args.workers, install_scenario, (sim, rides)) as p:
+                if args.report:
+                    func = run_variants_timed if batch else run_fleet_timed
+                else:
+                    func = run_variants if batch else run_fleet
+                if args.prescreen:
+                    results = screen.imap(
+                        p, func, pending, args.chunksize, variants=batch
+                    )
+                elif batch:
+                    results = itertools.chain.from_iterable(
+                        p.imap_unordered(func, window_variants(pending), args.chunksize)
+                    )
+                else:
+                    results = p.imap_unordered(func, pending, args.chunksize)
+                for r in profile.collect(results):
+                    with profile.phase("write"):
+                        writer.write(r)
+        elapsed = time.time() - start_time
+        report["sweeps"].append(profile.report())
+        print(f"{s.name}: {elapsed / 60:.3f} minutes")
+        print(
+            f"Results: {writer.count}, Skipped: {writer.skipped}, Pruned: {screen.skipped}"
+        )
+
+    if args.report:
+        write_report(args.report, report)
+        print(f"Timing report: {args.report}")
+
+
+def search(args):
+    """Trace each design of a scenario's singles sweeps by adaptive quantity
+    search."""
+    scenario = load_scenario(args.scenario)
+    sim = simulator(scenario, args.kernel)
+    rides = scenario.rides()
+    os.makedirs(args.output, exist_ok=True)
+
+    for s in scenario.sweeps:
+        if s.kind != "singles" or args.only and s.name not in args.only:
+            continue
+
+        designs = [
+            (v, q.start, q[-1], q.step)
+            for options, exclude, q in [
+                (BIKE_OPTIONS, s.exclude_bikes, s.bikes),
+                (CAR_OPTIONS, s.exclude_cars, s.cars),
+            ]
+            for v in vehicles(options, exclude)
+        ]
+        grid = sum(1 for _ in fleets(s, scenario.cost_cap))
+
+        start_time = time.time()
+        path = os.path.join(args.output, f"{s.name}_search.{args.format}")
+        with open_results(path) as writer:
+            with Pool(args.workers, install_scenario, (sim, rides)) as p:
+                for r in trace_curves(
+                    p,
+                    run_fleet,
+                    designs,
+                    args.tolerance,
+                    args.chunksize,
+                    scenario.cost_cap,
+                ):
+                    writer.write(r)
+        elapsed = time.time() - start_time
+        print(f"{s.name} search: {elapsed / 60:.3f} minutes")
+        print(f"Results: {writer.count}, Grid: {grid}")
+
+
+def optimize(args):
+    """Search mixed fleets of the full catalogue with NSGA-II."""
+    scenario = load_scenario(args.scenario)
+    sim = simulator(scenario, args.kernel)
+    rides = scenario.rides()
+    os.makedirs(args.output, exist_ok=True)
+    optimizer = NSGA2(catalogue(), args.types, args.population, scenario.cost_cap)
+
+    start_time = time.time()
+    path = os.path.join(args.output, f"optimized.{args.format}")
+    with open_results(path, slots=args.types) as writer:
+        with Pool(args.workers, install_scenario, (sim, rides)) as p:
+            for r in optimizer.run(p, run_fleet, args.generations, args.chunksize):
+                writer.write(r)
+    elapsed = time.time() - start_time
+    print(f"Optimize: {elapsed / 60:.3f} minutes")
+    print(f"Results: {writer.count}, Front: {len(optimizer.front())}")
+
+
+def replicate(args):
+    """Replicate the reference fleets over independently seeded demand
+    scenarios until their utility confidence intervals are narrow enough."""
+    scenario = load_scenario(args.scenario)
+    sim = simulator(scenario, args.kernel)
+    seeds = [scenario.seed]
+    seeds += [f"{scenario.seed}-{r}" for r in range(1, args.replications)]
+    tables = [scenario.rides(s) for s in seeds]
+    os.makedirs(args.output, exist_ok=True)
+
+    path = os.path.join(args.output, "references_replicated.csv")
+    with ResultWriter(path) as writer:
+        with Pool(args.workers, install_replicas, (sim, tables)) as p:
+            for r in replicate_fleets(
+                p,
+                scenario.references,
+                args.replications,
+                args.precision,
+                chunksize=args.chunksize,
+            ):
+                writer.write(r)
+                print(
+                    f"{r.vehicles}: utility {r.utility:.3f} +/- {r.utility_ci:.3f} ({r.replications} replications)"
+                )
+
+
+def trace(args):
+    """Simulate one fleet of a scenario and record its events."""
+    scenario = load_scenario(args.scenario)
+    configurations = [f.split(":") for f in args.fleet]
+    fleet = Fleet(
+        [design(d) for d, _ in configurations], [int(q) for _, q in configurations]
+    )
+
+    with TraceRecorder(args.output) as recorder:
+        result = scenario.sim.run((fleet, scenario.rides()), trace=recorder)
+    print(
+        f"Utility: {result.utility:.3f}, Completed: {result.completed}, "
+        f"Dropped: {result.dropped}, Impossible: {result.impossible}"
+    )
+    print(f"Events: {Trace(args.output).counts()} in {args.output}")
+
+
+def _simulation_arguments(parser, formats=True):
+    """Add the arguments shared by the commands that simulate in a Pool."""
+    parser.add_argument("scenario", help="scenario TOML file")
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count(), help="simulation processes"
+    )
+    parser.add_argument(
+        "--chunksize", type=int, default=8, help="fleets sent to a worker at a time"
+    )
+    if formats:
+        parser.add_argument(
+            "--format", choices=["csv", "npz"], default="npz", help="output format"
+        )
+    parser.add_argument("--output", default=".", help="directory for the result files")
+    parser.add_argument(
+        "--kernel",
+        action="store_true",
+        help="simulate with the compiled array kernel (needs numba)",
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="em411", description="Transport system performance simulator"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    parser_sweep = commands.add_parser("sweep", help="run the sweeps of a scenario")
+    _simulation_arguments(parser_sweep)
+    parser_sweep.add_argument(
+        "--only", action="append", help="run only the named sweep (repeatable)"
+    )
+    parser_sweep.add_argument(
+        "--prescreen",
+        action="store_true",
+        help="skip fleets that cannot beat the utility of a cheaper fleet",
+    )
+    parser_sweep.add_argument(
+        "--batch",
+        action="store_true",
+        help="simulate the quantity variants of each design in one kernel pass "
+        "(needs --kernel)",
+    )
+    parser_sweep.add_argument(
+        "--report", help="write a JSON report of where the sweep spent its time"
+    )
+    parser_sweep.set_defaults(func=sweep)
+
+    parser_search = commands.add_parser(
+        "search", help="trace each design of the singles sweeps adaptively"
+    )
+    _simulation_arguments(parser_search)
+    parser_search.add_argument(
+        "--only", action="append", help="search only the named sweep (repeatable)"
+    )
+    parser_search.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.01,
+        help="utility error allowed between traced quantities",
+    )
+    parser_search.set_defaults(func=search)
+
+    parser_optimize = commands.add_parser(
+        "optimize", help="search mixed fleets of the full catalogue with NSGA-II"
+    )
+    _simulation_arguments(parser_optimize)
+    parser_optimize.add_argument(
+        "--types", type=int, default=3, help="maximum vehicle designs in a fleet"
+    )
+    parser_optimize.add_argument(
+        "--population", type=int, default=64, help="fleets per generation"
+    )
+    parser_optimize.add_argument(
+        "--generations", type=int, default=30, help="generations to run"
+    )
+    parser_optimize.set_defaults(func=optimize)
+
+    parser_replicate = commands.add_parser(
+        "replicate", help="replicate the reference fleets over demand scenarios"
+    )
+    _simulation_arguments(parser_replicate, formats=False)
+    parser_replicate.add_argument(
+        "--replications",
+        type=int,
+        default=10,
+        help="most demand scenarios per fleet",
+    )
+    parser_replicate.add_argument(
+        "--precision",
+        type=float,
+        default=0.01,
+        help="stop once the utility 95%% CI half-width is within this",
+    )
+    parser_replicate.set_defaults(func=replicate)
+
+    parser_trace = commands.add_parser(
+        "trace", help="record the events of one fleet in a scenario"
+    )
+    parser_trace.add_argument("scenario", help="scenario TOML file")
+    parser_trace.add_argument(
+        "fleet", nargs="+", help="vehicle designs and quantities, e.g. B1E1G2K3:60"
+    )
+    parser_trace.add_argument("--output", default="fleet.trace", help="trace file")
+    parser_trace.set_defaults(func=trace)
+
+    args = parser.parse_args(argv)
+    if args.command == "sweep" and args.batch and not args.kernel:
+        parser_sweep.error("--batch needs --kernel")
+    args.func(args)
+
+
+if __name__ == "__main__":  # Necessary for multiprocessing
+    main()
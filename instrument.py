@@ -0,0 +1,123 @@
+# Robaire Galliath
+# EM 411, Fall 2024
+
+from contextlib import contextmanager
+import json
+import math
+import time
+
+#########################
+# Sweep Instrumentation #
+#########################
+
+# Breaks down where a sweep spends its time. The parent process times ride
+# generation, waiting on the Pool for each Result (including prescreening),
+# and writing Results. Workers running run_fleet_timed or run_variants_timed
+# time copying the ride table, the simulation loop, and Result aggregation,
+# and stamp when each task starts and finishes. Transfer is the time from a
+# worker finishing a task to the parent receiving it: pickling, the pipe,
+# unpickling, and waiting for the rest of its chunk. The pickle phase is an
+# estimate within transfer, not busy time, from each worker timing the
+# pickling of its first task's Results.
+
+WORKER_PHASES = ["copy", "simulate", "result", "pickle"]
+
+
+class SweepProfile:
+    """Phase timings of one sweep."""
+
+    name: str
+    phases: dict[str, float]  # Parent process [s]
+    workers: dict[int, dict]  # Totals by worker process id
+    transfer: list[float]  # [s] per task
+    fleets: int
+
+    def __init__(self, name):
+        self.name = name
+        self.phases = {}
+        self.workers = {}
+        self.transfer = []
+        self.fleets = 0
+        self.start = time.time()
+        self.clock = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        """Add the time spent in the block to a parent phase."""
+        clock = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - clock
+
+    def collect(self, results):
+        """Yield Results, timing the wait for each and taking their worker
+        timings off before they are written."""
+        results = iter(results)
+        while True:
+            with self.phase("wait"):
+                result = next(results, None)
+            if result is None:
+                return
+            self.fleets += 1
+            timings = vars(result).pop("timings", None)
+            if timings is not None:
+                self._add(timings, time.time())
+            yield result
+
+    def _add(self, timings, arrived):
+        worker = self.workers.setdefault(
+            timings["pid"],
+            {"tasks": 0, "fleets": 0, "busy": 0.0, "first": math.inf, "last": 0.0}
+            | {p: 0.0 for p in WORKER_PHASES},
+        )
+        worker["tasks"] += 1
+        worker["fleets"] += timings["fleets"]
+        worker["busy"] += timings["finish"] - timings["start"]
+        worker["first"] = min(worker["first"], timings["start"])
+        worker["last"] = max(worker["last"], timings["finish"])
+        for p in WORKER_PHASES:
+            worker[p] += timings.get(p, 0.0)
+        self.transfer.append(arrived - timings["finish"])
+
+    def report(self):
+        """Return the sweep's timings as a JSON-ready dict [s]."""
+        wall = time.perf_counter() - self.clock
+        workers = []
+        for pid, w in sorted(self.workers.items()):
+            workers.append(
+                {
+                    "pid": pid,
+                    "tasks": w["tasks"],
+                    "fleets": w["fleets"],
+                    "busy": w["busy"],
+                    "startup": w["first"] - self.start,
+                    "idle": (w["last"] - w["first"]) - w["busy"],
+                    "fleets_per_second": w["fleets"] / w["busy"] if w["busy"] else 0,
+                    "phases": {p: w[p] for p in WORKER_PHASES},
+                }
+            )
+
+        transfer = self.transfer or [0.0]
+        return {
+            "sweep": self.name,
+            "fleets": self.fleets,
+            "wall": wall,
+            "fleets_per_second": self.fleets / wall if wall else 0,
+            "parent": self.phases,
+            "worker_phases": {
+                p: sum(w["phases"][p] for w in workers) for p in WORKER_PHASES
+            },
+            "transfer": {
+                "total": sum(transfer),
+                "mean": sum(transfer) / len(transfer),
+                "max": max(transfer),
+            },
+            "workers": workers,
+        }
+
+
+def write_report(path, report: dict):
+    """Write a report as JSON."""
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
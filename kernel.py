@@ -0,0 +1,663 @@
+# Robaire Galliath
+# EM 411, Fall 2024
+
+from dataclasses import dataclass
+from transport import RealVehicle, Result, RideTable, Simulation, _lap
+from vehicle import _Vehicle, Fleet
+import numpy as np
+import time
+
+try:
+    from numba import njit
+
+    NUMBA = True
+except ImportError:
+    NUMBA = False
+
+###########################
+# Array Simulation Kernel #
+###########################
+
+# The dispatch, drop, and charge logic of Simulation.run over flat arrays of
+# vehicle and ride columns. Simulation.run stays the reference; these
+# kernels must give identical Results (see parity_kernel.py).
+#
+# Picking the vehicle with the smallest (next_available, battery, pax,
+# index) among those with enough seats and range is the same choice the
+# Dispatcher heaps make. With numba installed a loop over the same heaps is
+# compiled, otherwise each ride's choice is vectorized across the fleet
+# with numpy.
+
+
+def _earlier(i, j, available, battery, pax):
+    """Whether vehicle i is dispatched before vehicle j."""
+    if available[i] != available[j]:
+        return available[i] < available[j]
+    if battery[i] != battery[j]:
+        return battery[i] < battery[j]
+    if pax[i] != pax[j]:
+        return pax[i] < pax[j]
+    return i < j
+
+
+def _sift_up(heap, lo, k, available, battery, pax):
+    """Move heap[lo + k] up its bucket's heap to its place."""
+    while k > 0:
+        parent = (k - 1) // 2
+        if not _earlier(heap[lo + k], heap[lo + parent], available, battery, pax):
+            break
+        heap[lo + k], heap[lo + parent] = heap[lo + parent], heap[lo + k]
+        k = parent
+
+
+def _sift_down(heap, lo, size, k, available, battery, pax):
+    """Move heap[lo + k] down its bucket's heap of `size` to its place."""
+    while True:
+        child = 2 * k + 1
+        if child >= size:
+            break
+        if child + 1 < size and _earlier(
+            heap[lo + child + 1], heap[lo + child], available, battery, pax
+        ):
+            child += 1
+        if not _earlier(heap[lo + child], heap[lo + k], available, battery, pax):
+            break
+        heap[lo + k], heap[lo + child] = heap[lo + child], heap[lo + k]
+        k = child
+
+
+def _dispatch_loop(
+    distance,
+    passengers,
+    start,
+    pax,
+    capacity,
+    consumption,
+    speed,
+    charge_power,
+    max_wait,
+    dwell_time,
+    charge_distance,
+    penalty,
+    filled_time,
+    complete_time,
+):
+    """Fill the filled and complete time columns, keeping each seat count's
+    vehicles in a heap as the Dispatcher does."""
+    n = len(pax)
+    battery = capacity.copy()
+    reach = (battery * 1000) / consumption  # Current range [km]
+    available = np.zeros(n)
+
+    # Bucket b holds heap[lo[b] : lo[b] + size[b]], vehicles with seats[b]
+    seats = np.unique(pax)
+    lo = np.zeros(len(seats), dtype=np.int64)
+    size = np.zeros(len(seats), dtype=np.int64)
+    bucket = np.searchsorted(seats, pax)
+    for i in range(n):
+        size[bucket[i]] += 1
+    for b in range(1, len(seats)):
+        lo[b] = lo[b - 1] + size[b - 1]
+    size[:] = 0
+    heap = np.zeros(n, dtype=np.int64)
+    for i in range(n):
+        b = bucket[i]
+        heap[lo[b] + size[b]] = i
+        _sift_up(heap, lo[b], size[b], available, battery, pax)
+        size[b] += 1
+
+    skipped = np.zeros(n, dtype=np.int64)  # Vehicles set aside for range
+    for r in range(len(start)):
+        need = distance[r] * 2
+
+        # Each bucket with enough seats offers its first vehicle with the
+        # range, the others are set aside until the ride is placed
+        held = 0
+        best = -1
+        for b in range(np.searchsorted(seats, passengers[r]), len(seats)):
+            while size[b] > 0 and reach[heap[lo[b]]] < need:
+                skipped[held] = heap[lo[b]]
+                held += 1
+                size[b] -= 1
+                heap[lo[b]] = heap[lo[b] + size[b]]
+                _sift_down(heap, lo[b], size[b], 0, available, battery, pax)
+            if size[b] > 0 and (
+                best < 0 or _earlier(heap[lo[b]], best, available, battery, pax)
+            ):
+                best = heap[lo[b]]
+
+        if best >= 0 and available[best] - start[r] > max_wait:
+            complete_time[r] = -2  # Drop the ride
+        elif best >= 0:
+            travel_time = (distance[r] / speed[best]) + dwell_time
+            filled_time[r] = max(start[r], available[best])
+            complete_time[r] = filled_time[r] + travel_time
+            available[best] = filled_time[r] + travel_time * 2
+            battery[best] -= (consumption[best] * need) / 1000
+            reach[best] = (battery[best] * 1000) / consumption[best]
+            if reach[best] <= charge_distance:
+                charge_time = (capacity[best] - battery[best]) / charge_power[best]
+                available[best] += charge_time + penalty
+                battery[best] = capacity[best]
+                reach[best] = (battery[best] * 1000) / consumption[best]
+
+            # Its key only grew, so it sinks from the top of its heap
+            b = bucket[best]
+            _sift_down(heap, lo[b], size[b], 0, available, battery, pax)
+
+        for k in range(held):
+            b = bucket[skipped[k]]
+            heap[lo[b] + size[b]] = skipped[k]
+            _sift_up(heap, lo[b], size[b], available, battery, pax)
+            size[b] += 1
+
+
+def _dispatch_numpy(
+    distance,
+    passengers,
+    start,
+    pax,
+    capacity,
+    consumption,
+    speed,
+    charge_power,
+    max_wait,
+    dwell_time,
+    charge_distance,
+    penalty,
+    filled_time,
+    complete_time,
+):
+    """Fill the filled and complete time columns, one ride at a time."""
+    battery = capacity.copy()
+    reach = (battery * 1000) / consumption  # Current range [km]
+    available = np.zeros(len(pax))
+    seated = {p: np.flatnonzero(pax >= p) for p in np.unique(passengers).tolist()}
+    for r, (d, p, s) in enumerate(
+        zip(distance.tolist(), passengers.tolist(), start.tolist())
+    ):
+        need = d * 2
+        candidates = seated[p]
+        candidates = candidates[reach[candidates] >= need]
+        if candidates.size == 0:
+            continue
+
+        # Narrow ties on each key in turn; the lowest index remains first
+        for key in (available, battery, pax):
+            if candidates.size == 1:
+                break
+            values = key[candidates]
+            candidates = candidates[values == values.min()]
+        best = candidates[0]
+
+        next_available = float(available[best])
+        if next_available - s > max_wait:
+            complete_time[r] = -2  # Drop the ride
+            continue
+
+        travel_time = (d / speed[best]) + dwell_time
+        filled_time[r] = max(s, next_available)
+        complete_time[r] = filled_time[r] + travel_time
+        available[best] = filled_time[r] + travel_time * 2
+        battery[best] -= (consumption[best] * need) / 1000
+        reach[best] = (battery[best] * 1000) / consumption[best]
+        if reach[best] <= charge_distance:
+            charge_time = (capacity[best] - battery[best]) / charge_power[best]
+            available[best] += charge_time + penalty
+            battery[best] = capacity[best]
+            reach[best] = (battery[best] * 1000) / consumption[best]
+
+
+def _peak_sweep(order, ends, added, start_times, passengers, window):
+    """Fenwick tree sweep of peak_volume from the latest start."""
+    n = len(order)
+    tree = np.zeros(n + 1, dtype=np.int64)
+    peak = 0
+    j = 0
+    end = n  # Completions within the current window, by bisect_right
+    for i in order:
+        while j < n and start_times[order[j]] > start_times[i]:
+            k = order[j]
+            pos = added[k]
+            while pos <= n:
+                tree[pos] += passengers[k]
+                pos += pos & -pos
+            j += 1
+
+        while end > 0 and ends[end - 1] > start_times[i] + window:
+            end -= 1
+        pos = end
+        pax = 0
+        while pos > 0:
+            pax += tree[pos]
+            pos -= pos & -pos
+        peak = max(pax, peak)
+
+    return peak
+
+
+def _block_sum(values, start, n):
+    """Sum at most 128 values as numpy's pairwise summation does, eight
+    running sums at a time."""
+    if n < 8:
+        total = 0.0
+        for i in range(start, start + n):
+            total += values[i]
+        return total
+    r0 = values[start]
+    r1 = values[start + 1]
+    r2 = values[start + 2]
+    r3 = values[start + 3]
+    r4 = values[start + 4]
+    r5 = values[start + 5]
+    r6 = values[start + 6]
+    r7 = values[start + 7]
+    i = start + 8
+    while i < start + n - n % 8:
+        r0 += values[i]
+        r1 += values[i + 1]
+        r2 += values[i + 2]
+        r3 += values[i + 3]
+        r4 += values[i + 4]
+        r5 += values[i + 5]
+        r6 += values[i + 6]
+        r7 += values[i + 7]
+        i += 8
+    total = ((r0 + r1) + (r2 + r3)) + ((r4 + r5) + (r6 + r7))
+    while i < start + n:
+        total += values[i]
+        i += 1
+    return total
+
+
+def _pairwise_sum(values, n):
+    """Sum the first n values the way ndarray.sum() does, so compiled totals
+    match Result bit for bit. Ranges over 128 values are split in halves
+    rounded to a multiple of eight and their sums added; the splits are
+    walked with a stack, as numba cannot cache recursive functions."""
+    starts = np.zeros(64, dtype=np.int64)
+    sizes = np.zeros(64, dtype=np.int64)
+    split = np.zeros(64, dtype=np.int64)  # Halves of each range pushed
+    sums = np.zeros(64)
+    sizes[0] = n
+    top = 0
+    done = 0
+    while top >= 0:
+        half = sizes[top] // 2
+        half -= half % 8
+        if sizes[top] <= 128:
+            sums[done] = _block_sum(values, starts[top], sizes[top])
+            done += 1
+            top -= 1
+        elif split[top] < 2:
+            starts[top + 1] = starts[top] + half * split[top]
+            sizes[top + 1] = half if split[top] == 0 else sizes[top] - half
+            split[top + 1] = 0
+            split[top] += 1
+            top += 1
+        else:
+            done -= 1
+            sums[done - 1] += sums[done]
+            top -= 1
+    return sums[0]
+
+
+def _totals(start, filled, complete, passengers, distance, availability):
+    """Return the ride totals behind a Result: (completed, dropped,
+    impossible, pax volume, peak volume, wait sum, longest wait, duration
+    sum, distance sum, rides waiting less than `availability`), in minutes
+    and kilometers. Sums are taken in Result's order."""
+    n = len(start)
+    completed = 0
+    dropped = 0
+    impossible = 0
+    for r in range(n):
+        if complete[r] > 0.0:
+            completed += 1
+        elif complete[r] == -2.0:
+            dropped += 1
+        elif complete[r] == -1.0:
+            impossible += 1
+    if completed == 0:
+        # No wait to take the maximum of, and Result raises for this fleet
+        return (completed, dropped, impossible, 0, 0, 0.0, 0.0, 0.0, 0.0, 0)
+
+    starts = np.empty(completed)
+    ends = np.empty(completed)
+    pax = np.empty(completed, dtype=np.int64)
+    wait = np.empty(completed)
+    duration = np.empty(completed)
+    travelled = np.empty(completed)
+    volume = 0
+    available = 0
+    k = 0
+    for r in range(n):
+        if complete[r] > 0.0:
+            starts[k] = start[r]
+            ends[k] = complete[r]
+            pax[k] = passengers[r]
+            wait[k] = (filled[r] - start[r]) * 60
+            duration[k] = (complete[r] - filled[r]) * 60
+            travelled[k] = distance[r]
+            volume += passengers[r]
+            if wait[k] < availability:
+                available += 1
+            k += 1
+
+    # Peak volume as in transport.peak_volume
+    ordered = True
+    for i in range(1, completed):
+        if starts[i] < starts[i - 1]:
+            ordered = False
+            break
+    if ordered:
+        # Rides are generated in start order, so ride k counts toward the
+        # run of rides that start before it and within the window of its
+        # completion. Adding each run to a difference array gives every
+        # window's volume in one pass.
+        change = np.zeros(completed + 1, dtype=np.int64)
+        first = 0  # First ride starting with ride k
+        for k in range(completed):
+            if k > 0 and starts[k] != starts[k - 1]:
+                first = k
+
+            # First ride whose window holds this completion
+            lo = 0
+            hi = first
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if starts[mid] + 1.0 < ends[k]:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            if lo < first:
+                change[lo] += pax[k]
+                change[first] -= pax[k]
+        peak = 0
+        running = 0
+        for i in range(completed):
+            running += change[i]
+            peak = max(peak, running)
+    else:
+        # Each completion is added at its bisect_left position, ties sharing
+        # the first, and each window is found by sweeping a pointer
+        by_end = np.argsort(ends, kind="mergesort")
+        ends = ends[by_end]
+        added = np.empty(completed, dtype=np.int64)
+        first = 0
+        for i in range(completed):
+            if i > 0 and ends[i] != ends[i - 1]:
+                first = i
+            added[by_end[i]] = first + 1
+        order = np.argsort(-starts, kind="mergesort")
+        peak = _peak_sweep(order, ends, added, starts, pax, 1.0)
+
+    return (
+        completed,
+        dropped,
+        impossible,
+        volume,
+        peak,
+        _pairwise_sum(wait, completed),
+        wait.max(),
+        _pairwise_sum(duration, completed),
+        _pairwise_sum(travelled, completed),
+        available,
+    )
+
+
+def _dispatch_batch(
+    distance,
+    passengers,
+    start,
+    size,
+    pax,
+    capacity,
+    consumption,
+    speed,
+    charge_power,
+    max_wait,
+    dwell_time,
+    charge_distance,
+    penalty,
+    filled_time,
+    complete_time,
+):
+    """_dispatch_loop for each row of (fleet, vehicle) columns, filling
+    (fleet, ride) time columns. Row b holds size[b] vehicles."""
+    for b in range(len(size)):
+        n = size[b]
+        _dispatch_loop(
+            distance,
+            passengers,
+            start,
+            pax[b, :n],
+            capacity[b, :n],
+            consumption[b, :n],
+            speed[b, :n],
+            charge_power[b, :n],
+            max_wait,
+            dwell_time,
+            charge_distance,
+            penalty,
+            filled_time[b],
+            complete_time[b],
+        )
+
+
+def _dispatch_batch_numpy(
+    distance,
+    passengers,
+    start,
+    size,
+    pax,
+    capacity,
+    consumption,
+    speed,
+    charge_power,
+    max_wait,
+    dwell_time,
+    charge_distance,
+    penalty,
+    filled_time,
+    complete_time,
+):
+    """_dispatch_batch with each ride vectorized across every fleet and
+    vehicle. Padding vehicles have negative seats, so none is chosen."""
+    fleets = np.arange(len(size))
+    battery = capacity.copy()
+    reach = (battery * 1000) / consumption  # Current range [km]
+    available = np.zeros(pax.shape)
+    seated = {p: pax >= p for p in np.unique(passengers).tolist()}
+    for r, (d, p, s) in enumerate(
+        zip(distance.tolist(), passengers.tolist(), start.tolist())
+    ):
+        need = d * 2
+        eligible = seated[p] & (reach >= need)
+
+        # Narrow ties on each key in turn; the lowest index remains first
+        for key in (available, battery, pax):
+            values = np.where(eligible, key, np.inf)
+            eligible &= values == values.min(axis=1, keepdims=True)
+        found = eligible.any(axis=1)
+        rows = fleets[found]
+        best = eligible.argmax(axis=1)[found]
+
+        next_available = available[rows, best]
+        dropped = next_available - s > max_wait
+        complete_time[rows[dropped], r] = -2  # Drop the ride
+        rows = rows[~dropped]
+        best = best[~dropped]
+
+        travel_time = (d / speed[rows, best]) + dwell_time
+        filled = np.maximum(s, next_available[~dropped])
+        filled_time[rows, r] = filled
+        complete_time[rows, r] = filled + travel_time
+
+        used = battery[rows, best] - (consumption[rows, best] * need) / 1000
+        used_reach = (used * 1000) / consumption[rows, best]
+        charging = used_reach <= charge_distance
+        charge_time = (capacity[rows, best] - used) / charge_power[rows, best]
+        available[rows, best] = np.where(
+            charging,
+            (filled + travel_time * 2) + (charge_time + penalty),
+            filled + travel_time * 2,
+        )
+        battery[rows, best] = np.where(charging, capacity[rows, best], used)
+        reach[rows, best] = np.where(
+            charging,
+            (capacity[rows, best] * 1000) / consumption[rows, best],
+            used_reach,
+        )
+
+
+# Result fields and RealVehicle columns of each vehicle design seen so far
+_designs = {}
+
+
+def _design(vehicle: _Vehicle):
+    """Return the (design, cost, range, speed) Result fields and the (pax,
+    capacity, consumption, speed, charge_power) columns of a vehicle."""
+    key = (
+        type(vehicle),
+        vehicle.chassis,
+        vehicle.battery,
+        vehicle.charger,
+        vehicle.motor,
+        vehicle.autonomy,
+    )
+    if key not in _designs:
+        v = RealVehicle(vehicle)
+        _designs[key] = (
+            (vehicle.design(), vehicle.cost(), vehicle.range(), vehicle.speed()),
+            (v.pax, v.capacity, v.power_consumption, v.speed, v.charge_power),
+        )
+    return _designs[key]
+
+
+def _columns(vehicles, quantities):
+    """Return the vehicle count of each quantity vector, and its (pax,
+    capacity, consumption, speed, charge_power) columns padded to the
+    largest fleet."""
+    table = np.array([_design(v)[1] for v in vehicles], dtype=float).T
+    quantities = np.asarray(quantities, dtype=np.int64).reshape(-1, len(vehicles))
+    size = quantities.sum(axis=1)
+    columns = np.ones((len(table), len(quantities), size.max()))
+    columns[0] = -1  # Padding vehicles have no seats
+    for b, q in enumerate(quantities):
+        columns[:, b, : size[b]] = np.repeat(table, q, axis=1)
+    return size, [columns[0].astype(np.int64), *columns[1:]]
+
+
+if NUMBA:
+    _earlier = njit(cache=True)(_earlier)
+    _sift_up = njit(cache=True)(_sift_up)
+    _sift_down = njit(cache=True)(_sift_down)
+    _dispatch_loop = njit(cache=True)(_dispatch_loop)
+    _dispatch_batch = njit(cache=True)(_dispatch_batch)
+    _peak_sweep = njit(cache=True)(_peak_sweep)
+    _block_sum = njit(cache=True)(_block_sum)
+    _pairwise_sum = njit(cache=True)(_pairwise_sum)
+    _totals = njit(cache=True)(_totals)
+
+
+@dataclass
+class KernelSimulation(Simulation):
+    """Simulation.run on the array kernel, compiled when numba is available."""
+
+    compiled: bool = NUMBA
+
+    def run(self, args, trace=None, timings: dict = None):
+        """Return a Result, adding the seconds spent in each phase to
+        `timings` if given"""
+        if trace is not None:
+            raise ValueError("The array kernel does not record traces")
+        clock = time.perf_counter() if timings is not None else 0
+        (fleet, rides) = args
+        filled_time = np.full(len(rides), -1.0)
+        complete_time = np.full(len(rides), -1.0)
+
+        _, columns = _columns(fleet.vehicles, [fleet.quantities])
+        if timings is not None:
+            clock = _lap(timings, "copy", clock)
+        dispatch = _dispatch_loop if self.compiled else _dispatch_numpy
+        dispatch(
+            rides.distance,
+            rides.passengers,
+            rides.start_time,
+            *(c[0] for c in columns),
+            self.max_wait,
+            self.dwell_time,
+            self.charge_distance,
+            self.charge_time_penalty,
+            filled_time,
+            complete_time,
+        )
+        if timings is not None:
+            clock = _lap(timings, "simulate", clock)
+
+        result = self._result(
+            fleet.vehicles, fleet.quantities, rides, filled_time, complete_time
+        )
+        if timings is not None:
+            _lap(timings, "result", clock)
+        return result
+
+    def run_batch(
+        self, vehicles: list[_Vehicle], quantities, rides: RideTable, timings=None
+    ):
+        """Return a Result for each quantity vector of the same vehicle designs,
+        simulating them one after another in a single dispatch call."""
+        clock = time.perf_counter() if timings is not None else 0
+        size, columns = _columns(vehicles, quantities)
+        filled_time = np.full((len(size), len(rides)), -1.0)
+        complete_time = np.full((len(size), len(rides)), -1.0)
+        if timings is not None:
+            clock = _lap(timings, "copy", clock)
+        dispatch = _dispatch_batch if self.compiled else _dispatch_batch_numpy
+        dispatch(
+            rides.distance,
+            rides.passengers,
+            rides.start_time,
+            size,
+            *columns,
+            self.max_wait,
+            self.dwell_time,
+            self.charge_distance,
+            self.charge_time_penalty,
+            filled_time,
+            complete_time,
+        )
+        if timings is not None:
+            clock = _lap(timings, "simulate", clock)
+
+        results = [
+            self._result(vehicles, list(q), rides, filled, complete)
+            for q, filled, complete in zip(quantities, filled_time, complete_time)
+        ]
+        if timings is not None:
+            _lap(timings, "result", clock)
+        return results
+
+    def _result(self, vehicles, quantities, rides: RideTable, filled, complete):
+        """Return the Result of a fleet's filled and complete times. Compiled
+        totals skip building a RideTable and Result from scratch."""
+        if self.compiled:
+            totals = _totals(
+                rides.start_time,
+                filled,
+                complete,
+                rides.passengers,
+                rides.distance,
+                self.availability,
+            )
+            if totals[0] > 0:
+                fields = [_design(v)[0] for v in vehicles]
+                return Result.from_totals(fields, quantities, len(rides), totals)
+
+        # _totals leaves a fleet that completes no ride to Result, which
+        # raises as Simulation does
+        table = rides.fresh()
+        table.filled_time = filled
+        table.complete_time = complete
+        return Result(table, [], Fleet(vehicles, quantities), self.availability)
@@ -41,3 +41,19 @@ class MVU:
         return np.dot(
             [u.util(a) for a, u in zip(attributes, self.utilities)], self.weights
         )
+
+    def scores(self, attributes):
+        """Return the single attribute utilities [1] of an (N, k) array."""
+
+        attributes = np.asarray(attributes, dtype=float)
+        if attributes.ndim != 2 or attributes.shape[1] != len(self.utilities):
+            raise ValueError(f"Attributes must have shape (N, {len(self.utilities)})")
+
+        scores = np.empty(attributes.shape)
+        for i, u in enumerate(self.utilities):
+            scores[:, i] = u.util(attributes[:, i])
+        return scores
+
+    def evaluate_batch(self, attributes):
+        """Return the utility [1] of each row of an (N, k) array."""
+        return self.scores(attributes) @ np.asarray(self.weights)
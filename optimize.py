@@ -0,0 +1,189 @@
+# Robaire Galliath
+# EM 411, Fall 2024
+
+from designs import *
+from pareto import crowding_distance, non_dominated_rank, pareto_front
+from transport import Result
+import math
+import random
+
+#######################################
+# Evolutionary Search of Mixed Fleets #
+#######################################
+
+# NSGA-II over fleets of up to N vehicle types drawn from the full design
+# catalogue. A fleet is a set of (design, quantity) genes; offspring mix
+# their parents' genes and are mutated by changing a quantity, swapping one
+# component of a design, or adding or removing a design. Fleets over the
+# cost cap are repaired by scaling their quantities down. Each fleet is
+# simulated once, and every generation's new fleets go through the Pool
+# together.
+
+# Quantity range of each vehicle kind, by the first letter of its design
+QUANTITIES = {"B": (1, 150), "C": (1, 40)}
+
+
+def catalogue():
+    """Return every valid bike and car configuration string."""
+    return list(configurations(BIKE_OPTIONS)) + list(configurations(CAR_OPTIONS))
+
+
+class NSGA2:
+    """Multi-objective genetic search for low cost, high utility fleets."""
+
+    designs: list[str]  # Configuration strings to draw from
+    types: int  # Maximum vehicle designs per fleet
+    size: int  # Population size
+    cost_cap: float  # [$] fleet cost cap
+    archive: dict[tuple, Result]  # Every simulated fleet by genome
+
+    def __init__(
+        self,
+        designs: list[str],
+        types=3,
+        size=64,
+        cost_cap=math.inf,
+        quantities=QUANTITIES,
+        seed=0,
+    ):
+        self.designs = designs
+        self.types = types
+        self.size = size
+        self.cost_cap = cost_cap
+        self.quantities = quantities
+        self.random = random.Random(seed)
+        self.archive = {}
+        self.vehicles = {}
+
+        # Alternatives for each component of a design, by vehicle kind
+        self.options = {}
+        for d in designs:
+            parts = [d[i : i + 2] for i in range(0, len(d), 2)]
+            kind = self.options.setdefault(d[0], [set() for _ in parts])
+            for options, part in zip(kind, parts):
+                options.add(part)
+        self.options = {k: [sorted(o) for o in v] for k, v in self.options.items()}
+        self.valid = set(designs)
+
+    def vehicle(self, configuration):
+        """Return the vehicle of a configuration string, built once."""
+        if configuration not in self.vehicles:
+            self.vehicles[configuration] = design(configuration)
+        return self.vehicles[configuration]
+
+    def fleet(self, genome):
+        """Return the Fleet of a genome of (design, quantity) genes."""
+        return Fleet([self.vehicle(d) for d, _ in genome], [q for _, q in genome])
+
+    def _gene(self):
+        d = self.random.choice(self.designs)
+        return (d, self.random.randint(*self.quantities[d[0]]))
+
+    def _repair(self, genes):
+        """Return a sorted genome with unique designs within the cost cap."""
+        genes = dict(genes[: self.types])
+        while True:
+            genome = tuple(sorted(genes.items()))
+            cost = self.fleet(genome).cost() if genome else math.inf
+            if genome and cost <= self.cost_cap:
+                return genome
+            if not genome:
+                genes = dict([self._gene()])
+                continue
+
+            # Scale every quantity down, dropping designs below their range
+            scale = self.cost_cap / cost
+            for d, q in list(genes.items()):
+                low = self.quantities[d[0]][0]
+                q = min(math.floor(q * scale), q - 1)
+                if q < low:
+                    del genes[d]
+                else:
+                    genes[d] = q
+
+    def _mutate(self, genes):
+        genes = list(genes)
+        move = self.random.randrange(4)
+        i = self.random.randrange(len(genes))
+        d, q = genes[i]
+        if move == 0:
+            # Change a quantity by up to a fifth of its range
+            low, high = self.quantities[d[0]]
+            step = max(round(self.random.gauss(0, (high - low) / 5)), 1)
+            genes[i] = (d, min(max(q + self.random.choice([-1, 1]) * step, low), high))
+        elif move == 1:
+            # Swap one component of a design
+            parts = [d[j : j + 2] for j in range(0, len(d), 2)]
+            j = self.random.randrange(len(parts))
+            parts[j] = self.random.choice(self.options[d[0]][j])
+            if "".join(parts) in self.valid:
+                genes[i] = ("".join(parts), q)
+        elif move == 2 and len(genes) < self.types:
+            genes.append(self._gene())
+        elif move == 3 and len(genes) > 1:
+            del genes[i]
+        return genes
+
+    def _child(self, a, b):
+        genes = [g for g in a + b if self.random.random() < 0.5]
+        self.random.shuffle(genes)
+        if not genes:
+            genes = [self.random.choice(a + b)]
+        return self._repair(self._mutate(genes))
+
+    def _evaluate(self, pool, func, genomes, chunksize):
+        """Simulate genomes not yet in the archive, yielding their Results."""
+        pending = [g for g in dict.fromkeys(genomes) if g not in self.archive]
+        fleets = [self.fleet(g) for g in pending]
+        for g, r in zip(pending, pool.imap(func, fleets, chunksize)):
+            self.archive[g] = r
+            yield r
+
+    def _select(self, genomes):
+        """Return the best `size` genomes by front, then crowding distance."""
+        genomes = list(dict.fromkeys(genomes))
+        objectives = [
+            (-self.archive[g].fleet_cost, self.archive[g].utility) for g in genomes
+        ]
+        rank = non_dominated_rank(objectives)
+        crowding = crowding_distance(objectives, rank)
+        order = sorted(range(len(genomes)), key=lambda i: (rank[i], -crowding[i]))
+        chosen = order[: self.size]
+        return [genomes[i] for i in chosen], rank[chosen], crowding[chosen]
+
+    def _tournament(self, population, rank, crowding):
+        i, j = self.random.sample(range(len(population)), 2)
+        if (rank[i], -crowding[i]) <= (rank[j], -crowding[j]):
+            return population[i]
+        return population[j]
+
+    def run(self, pool, func, generations=30, chunksize=1):
+        """Yield the Result of each fleet simulated over the generations."""
+        population = [
+            self._repair(
+                [self._gene() for _ in range(self.random.randint(1, self.types))]
+            )
+            for _ in range(self.size)
+        ]
+        yield from self._evaluate(pool, func, population, chunksize)
+        population, rank, crowding = self._select(population)
+
+        for _ in range(generations):
+            offspring = [
+                self._child(
+                    list(self._tournament(population, rank, crowding)),
+                    list(self._tournament(population, rank, crowding)),
+                )
+                for _ in range(self.size)
+            ]
+            yield from self._evaluate(pool, func, offspring, chunksize)
+            population, rank, crowding = self._select(population + offspring)
+
+    def front(self):
+        """Return the cost/utility Pareto front of every simulated fleet,
+        cheapest first."""
+        results = sorted(self.archive.values(), key=lambda r: r.fleet_cost)
+        mask = pareto_front(
+            [r.fleet_cost for r in results], [r.utility for r in results]
+        )
+        return [r for r, m in zip(results, mask) if m]
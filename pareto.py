@@ -0,0 +1,327 @@
+# Robaire Galliath
+# EM 411, Fall 2024
+
+import bisect
+import numpy as np
+
+LEAF = 4096  # Rows swept directly when extracting a front
+PIVOTS = 64  # Leading candidates compared against the rest at once
+CHUNK = 1_048_576  # Pivot-candidate pairs compared at once
+RANK_LEAF = 64  # Rows ranked directly against each other
+RANK_PAIRS = 4096  # Row pairs compared directly when ranking
+
+
+def is_pareto(utility):
+    """Return a mask of rows with higher utility than every earlier row.
+
+    Assumes the input is sorted by cost, so a row is on the front when no
+    cheaper (earlier) row has equal or greater utility.
+    """
+    utility = np.asarray(utility, dtype=float)
+    best = np.maximum.accumulate(utility)
+    previous = np.concatenate(([-np.inf], best[:-1]))
+    return utility > previous
+
+
+def pareto_front(cost, utility):
+    """Return a mask of the cost/utility Pareto front in the input order."""
+    order = np.argsort(cost, kind="stable")
+    mask = np.empty(len(order), dtype=bool)
+    mask[order] = is_pareto(np.asarray(utility)[order])
+    return mask
+
+
+def _descending(objectives):
+    """Return row indices sorted lexicographically, largest first."""
+    return np.lexsort(-objectives.T[::-1])
+
+
+def pareto_mask(objectives):
+    """Return a mask of non-dominated rows of an (N, k) array.
+
+    Every objective is maximized, so negate costs and wait times. Large
+    inputs are split in halves, and only the union of the two halves'
+    fronts is swept again, which keeps each sweep small.
+    """
+    objectives = np.asarray(objectives, dtype=float)
+    mask = np.zeros(len(objectives), dtype=bool)
+    mask[_front(objectives, np.arange(len(objectives)))] = True
+    return mask
+
+
+def _front(objectives, rows):
+    """Return the rows not dominated by any other row."""
+    if len(rows) > LEAF:
+        half = len(rows) // 2
+        rows = np.concatenate(
+            (_front(objectives, rows[:half]), _front(objectives, rows[half:]))
+        )
+    return _sweep(objectives, rows)
+
+
+def _dominates(a, b):
+    """Return an (len(a), len(b)) mask of rows of a dominating rows of b."""
+    ge = np.ones((len(a), len(b)), dtype=bool)
+    gt = np.zeros((len(a), len(b)), dtype=bool)
+    for j in range(a.shape[1]):
+        x = a[:, j, None]
+        y = b[None, :, j]
+        ge &= x >= y
+        gt |= x > y
+    return ge & gt
+
+
+def _sweep(objectives, rows):
+    """Return the rows not dominated by any other row.
+
+    Rows are ordered by their normalized objective sum, with ties broken
+    lexicographically, so a row can only be dominated by an earlier row.
+    The leading candidates are taken PIVOTS at a time; those not dominated
+    by each other are on the front and remove every later candidate they
+    dominate.
+    """
+    if len(rows) == 0:
+        return rows
+    values = objectives[rows]
+    span = np.ptp(values, axis=0)
+    score = ((values - values.min(axis=0)) / np.where(span > 0, span, 1)).sum(axis=1)
+    order = np.lexsort(tuple(-values.T[::-1]) + (-score,))
+    values = values[order]
+
+    candidates = np.arange(len(values))
+    start = 0
+    while start < len(candidates):
+        pivots = candidates[start : start + PIVOTS]
+        front = pivots[~_dominates(values[pivots], values[pivots]).any(axis=0)]
+
+        rest = candidates[start + len(pivots) :]
+        dominated = np.zeros(len(rest), dtype=bool)
+        step = max(CHUNK // max(len(front), 1), 1)
+        for i in range(0, len(rest), step):
+            chunk = values[rest[i : i + step]]
+            dominated[i : i + step] = _dominates(values[front], chunk).any(axis=0)
+
+        candidates = np.concatenate((candidates[:start], front, rest[~dominated]))
+        start += len(front)
+
+    return np.sort(rows[order[candidates]])
+
+
+def non_dominated_rank(objectives):
+    """Return the front index of each row of an (N, k) array, 0 being the
+    Pareto front. Every objective is maximized.
+
+    Two and three objectives are ranked in a single sweep; more objectives
+    use Jensen's divide and conquer, as generalized by Fortin et al., in
+    O(n log^(k-1) n), comparing small subsets directly. Its many small array
+    operations make it slow on large inputs: a million uniform rows take
+    about 2.5 s with two objectives, 8.5 s with three, but 110 s with four,
+    where pareto_mask takes 1.4 s. Use pareto_mask when only the front is
+    needed.
+    """
+    objectives = np.asarray(objectives, dtype=float)
+    rank = np.zeros(len(objectives), dtype=np.int64)
+
+    if objectives.shape[1] == 2:
+        # In sweep order a front's last row dominates a new row exactly when
+        # its (second, first) objectives are lexicographically greater, and
+        # these keys strictly decrease from one front to the next
+        lasts = []  # Negated (second, first) objectives of each front's last row
+        order = _descending(objectives)
+        for i, (a, b) in zip(order.tolist(), objectives[order].tolist()):
+            f = bisect.bisect_left(lasts, (-b, -a))
+            if f == len(lasts):
+                lasts.append((-b, -a))
+            else:
+                lasts[f] = (-b, -a)
+            rank[i] = f
+        return rank
+
+    if objectives.shape[1] == 3:
+        # A row joins the first front with no row dominating it, found by a
+        # binary search as each front dominates the rows the next one does.
+        # Rows come by first objective, so a front only keeps the staircase
+        # of its (second, third) objectives, ascending in the second.
+        # Identical rows are ranked once.
+        (unique, inverse) = np.unique(objectives, axis=0, return_inverse=True)
+        seconds = []  # Each front's staircase, ascending
+        thirds = []  # Matching third objectives, descending
+        ranked = np.zeros(len(unique), dtype=np.int64)
+        for i, (_, b, c) in reversed(list(enumerate(unique.tolist()))):
+            lo, hi = 0, len(seconds)
+            while lo < hi:
+                f = (lo + hi) // 2
+                j = bisect.bisect_left(seconds[f], b)
+                if j < len(seconds[f]) and thirds[f][j] >= c:
+                    lo = f + 1
+                else:
+                    hi = f
+            ranked[i] = lo
+            if lo == len(seconds):
+                seconds.append([b])
+                thirds.append([c])
+                continue
+
+            # Replace the staircase steps this row covers
+            j = bisect.bisect_right(seconds[lo], b)
+            start = j
+            while start > 0 and thirds[lo][start - 1] <= c:
+                start -= 1
+            seconds[lo][start:j] = [b]
+            thirds[lo][start:j] = [c]
+        return ranked[inverse.ravel()]
+
+    # Minimize the negated objectives in ascending lexicographic order, so
+    # every row comes after the rows that dominate it. A row's rank is one
+    # more than the highest rank of the rows dominating it.
+    order = _descending(objectives)
+    values = -objectives[order]
+    sorted_rank = np.zeros(len(values), dtype=np.int64)
+    _rank_a(values, sorted_rank, np.arange(len(values)), values.shape[1] - 1)
+    rank[order] = sorted_rank
+    return rank
+
+
+def _rank_a(values, rank, rows, k):
+    """Rank rows, in sorted order, against each other on objectives 0..k.
+    The rows are equal on every objective after k."""
+    if len(rows) < 2 or k < 0:
+        return
+    if len(rows) <= RANK_LEAF:
+        return _brute_a(values, rank, rows, k)
+
+    column = values[rows, k]
+    if column.min() == column.max():
+        return _rank_a(values, rank, rows, k - 1)
+
+    # Rows below the median cannot be dominated by rows above it
+    median = np.partition(column, len(column) // 2)[len(column) // 2]
+    low = column < median
+    if not low.any():
+        low = column <= median
+    _rank_a(values, rank, rows[low], k)
+    _rank_b(values, rank, rows[low], rows[~low], k - 1)
+    _rank_a(values, rank, rows[~low], k)
+
+
+def _rank_b(values, rank, low, high, k):
+    """Raise the ranks of `high` rows dominated by the already ranked `low`
+    rows. Every low row is no worse than every high row on the objectives
+    after k, and strictly better on one of them."""
+    if len(low) == 0 or len(high) == 0:
+        return
+    if k < 0:
+        rank[high] = np.maximum(rank[high], rank[low].max() + 1)
+        return
+    if k == 0:
+        # Highest rank among the low rows at or below each high row
+        order = np.argsort(values[low, 0], kind="stable")
+        highest = np.maximum.accumulate(rank[low[order]])
+        count = np.searchsorted(values[low[order], 0], values[high, 0], "right")
+        raised = np.where(count > 0, highest[count - 1] + 1, 0)
+        rank[high] = np.maximum(rank[high], raised)
+        return
+    if len(low) * len(high) <= RANK_PAIRS:
+        return _brute_b(values, rank, low, high, k)
+    if k == 1:
+        highest = _highest_below(values[low, :2], rank[low], values[high, :2])
+        rank[high] = np.maximum(rank[high], highest + 1)
+        return
+
+    a = values[low, k]
+    b = values[high, k]
+    if a.max() <= b.min():
+        return _rank_b(values, rank, low, high, k - 1)
+    if a.min() > b.max():
+        return
+
+    # Split both sets at a pivot that leaves each half smaller
+    both = np.concatenate((a, b))
+    pivot = np.partition(both, len(both) // 2)[len(both) // 2]
+    if (a <= pivot).all() and (b < pivot).all():
+        pivot = b.max()
+    elif (a > pivot).all() and (b >= pivot).all():
+        pivot = a.min()
+    low1, low2 = low[a <= pivot], low[a > pivot]
+    high1, high2 = high[b < pivot], high[b >= pivot]
+    _rank_b(values, rank, low1, high1, k)
+    _rank_b(values, rank, low1, high2, k - 1)
+    _rank_b(values, rank, low2, high2, k)
+
+
+def _highest_below(points, rank, queries):
+    """Return the highest rank of the points at or below each query point on
+    both coordinates, or -1.
+
+    Points sorted by first coordinate are grouped into blocks of each power
+    of two, as in a Fenwick tree, and the prefix of points at or below a
+    query's first coordinate is the union of one block per set bit of its
+    length. Each block is sorted by second coordinate with a running maximum
+    rank, so all queries are answered a level at a time.
+    """
+    order = np.argsort(points[:, 0], kind="stable")
+    first = points[order, 0]
+    rank = rank[order]
+    second = np.unique(points[:, 1])
+    position = np.searchsorted(second, points[order, 1])
+    limit = np.searchsorted(second, queries[:, 1], side="right")
+    length = np.searchsorted(first, queries[:, 0], side="right")
+
+    highest = np.full(len(queries), -1, dtype=np.int64)
+    span = len(second) + 1  # Keys are block * span + position
+    step = rank.max() + 2  # Keeps running maxima within a block
+    level = 0
+    while (1 << level) <= len(first):
+        block = np.arange(len(first)) >> level
+        keys = block * span + position
+        by_key = np.argsort(keys, kind="stable")
+        keys = keys[by_key]
+        running = np.maximum.accumulate(rank[by_key] + block[by_key] * step)
+        running -= block[by_key] * step
+
+        (asked,) = np.nonzero((length >> level) & 1)
+        wanted = (length[asked] >> level) - 1
+        found = np.searchsorted(keys, wanted * span + limit[asked]) - 1
+        hit = (found >= 0) & (keys[np.maximum(found, 0)] // span == wanted)
+        highest[asked[hit]] = np.maximum(highest[asked[hit]], running[found[hit]])
+        level += 1
+    return highest
+
+
+def _brute_a(values, rank, rows, k):
+    v = values[rows, : k + 1]
+    no_worse = (v[:, None] <= v[None, :]).all(axis=2)
+    better = (v[:, None] < v[None, :]).any(axis=2)
+    dominates = no_worse & better
+    r = rank[rows]
+    for j in range(1, len(rows)):
+        above = dominates[:j, j]
+        if above.any():
+            r[j] = max(r[j], r[:j][above].max() + 1)
+    rank[rows] = r
+
+
+def _brute_b(values, rank, low, high, k):
+    a = values[low, : k + 1]
+    b = values[high, : k + 1]
+    dominates = (a[:, None] <= b[None, :]).all(axis=2)
+    raised = np.where(dominates, rank[low, None] + 1, 0).max(axis=0)
+    rank[high] = np.maximum(rank[high], raised)
+
+
+def crowding_distance(objectives, rank):
+    """Return the crowding distance of each row of an (N, k) array within
+    its front, infinite at the ends of each objective."""
+    objectives = np.asarray(objectives, dtype=float)
+    distance = np.zeros(len(objectives))
+    for front in np.unique(rank):
+        rows = np.flatnonzero(rank == front)
+        for j in range(objectives.shape[1]):
+            values = objectives[rows, j]
+            order = np.argsort(values, kind="stable")
+            span = values[order[-1]] - values[order[0]]
+            if span > 0 and len(rows) > 2:
+                gaps = (values[order[2:]] - values[order[:-2]]) / span
+                distance[rows[order[1:-1]]] += gaps
+            distance[rows[order[[0, -1]]]] = np.inf
+    return distance
@@ -0,0 +1,126 @@
+# Robaire Galliath
+# EM 411, Fall 2024
+
+from em411 import fleets, load_scenario
+from kernel import NUMBA, KernelSimulation
+from transport import EventSimulation, Result, group_variants
+from vehicle import Fleet
+import dataclasses
+import math
+import time
+
+########################################
+# Array Kernels against Simulation.run #
+########################################
+
+# Simulates a sample of each scenario's sweep fleets with the reference loop
+# and each array kernel, one fleet at a time and in batches of the quantity
+# variants of each design. Reports any Result field that differs, and
+# compares their best throughput over REPEATS runs on a single core.
+#
+# EventSimulation with unlimited chargers is checked one fleet at a time as
+# well. It adds up wait times in a different order, so its floats only have
+# to agree to within rounding.
+
+SCENARIOS = ["scenarios/q3.toml", "scenarios/q4.toml"]
+FLEETS = 50  # Fleets sampled from each sweep of a scenario
+REPEATS = 3  # Timed runs of each engine, the fastest is reported
+TOLERANCE = 1e-12  # Relative difference allowed for EventSimulation
+
+
+def sample(scenario):
+    """Return about FLEETS fleets from each of the scenario's sweeps as
+    (vehicles, quantity vectors) batches of designs spread evenly over it."""
+    batches = []
+    for s in scenario.sweeps:
+        groups = group_variants(fleets(s, scenario.cost_cap))
+        size = sum(len(q) for _, q in groups) / len(groups)
+        step = max(round(len(groups) * size / FLEETS), 1)
+        batches.extend(groups[::step])
+    return batches
+
+
+def differences(a: Result, b: Result, tolerance=0):
+    """Return the names of the Result fields that differ."""
+    return [
+        name
+        for name in Result.__annotations__
+        if not (
+            getattr(a, name) == getattr(b, name)
+            or isinstance(getattr(a, name), float)
+            and math.isclose(getattr(a, name), getattr(b, name), rel_tol=tolerance)
+        )
+    ]
+
+
+if __name__ == "__main__":
+
+    for path in SCENARIOS:
+        scenario = load_scenario(path)
+        rides = scenario.rides()
+        batches = sample(scenario)
+        fleet_list = [Fleet(v, q) for v, qs in batches for q in qs]
+        print(
+            f"{scenario.name}: {len(rides)} rides, {len(fleet_list)} fleets "
+            f"in {len(batches)} batches"
+        )
+
+        kernels = {
+            "numpy": KernelSimulation(
+                **dataclasses.asdict(scenario.sim), compiled=False
+            )
+        }
+        if NUMBA:
+            kernels["numba"] = KernelSimulation(**dataclasses.asdict(scenario.sim))
+            # Compile before timing
+            kernels["numba"].run((fleet_list[0], rides))
+            kernels["numba"].run_batch(*batches[0], rides)
+
+        def timed(run):
+            """Return the results of run() and its fastest time [s]."""
+            fastest = math.inf
+            for _ in range(REPEATS):
+                start_time = time.perf_counter()
+                results = run()
+                fastest = min(fastest, time.perf_counter() - start_time)
+            return results, fastest
+
+        reference, elapsed = timed(
+            lambda: [scenario.sim.run((f, rides)) for f in fleet_list]
+        )
+        print(f"  reference: {len(fleet_list) / elapsed:8.1f} fleets/s")
+
+        events = EventSimulation(**dataclasses.asdict(scenario.sim))
+        engines = [
+            ("event", lambda: [events.run((f, rides)) for f in fleet_list], TOLERANCE)
+        ]
+        for name, sim in kernels.items():
+            engines.append(
+                (name, lambda sim=sim: [sim.run((f, rides)) for f in fleet_list], 0)
+            )
+            engines.append(
+                (
+                    f"{name} batch",
+                    lambda sim=sim: [
+                        r for v, qs in batches for r in sim.run_batch(v, qs, rides)
+                    ],
+                    0,
+                )
+            )
+
+        for label, run, tolerance in engines:
+            results, kernel_elapsed = timed(run)
+
+            mismatched = 0
+            for a, b in zip(reference, results):
+                fields = differences(a, b, tolerance)
+                if fields:
+                    mismatched += 1
+                    print(
+                        f"  {label} differs for {a.vehicles} "
+                        f"{a.vehicle_quantities}: {fields}"
+                    )
+            print(
+                f"  {label}: {len(fleet_list) / kernel_elapsed:8.1f} fleets/s, "
+                f"{elapsed / kernel_elapsed:.1f}x, {mismatched} mismatched"
+            )
@@ -0,0 +1,205 @@
+# Robaire Galliath
+# EM 411, Fall 2024
+
+from mvu import MVU, Utility
+from transport import (
+    RealVehicle,
+    RideTable,
+    Simulation,
+    group_variants,
+    mvu,
+    peak_volume,
+)
+from vehicle import Fleet
+import bisect
+import itertools
+import numpy as np
+
+####################################
+# Analytic Pre-screening of Fleets #
+####################################
+
+# A fleet can only be on the cost/utility Pareto front if its utility beats
+# every cheaper fleet. Each fleet gets an upper bound on the utility it
+# could achieve, and is skipped when a simulated fleet costing no more
+# already reaches that bound, so the front is unchanged.
+#
+# The bounds relax the simulation rather than estimate it:
+#   - A ride can only be served by a vehicle with enough seats and full
+#     range for the round trip.
+#   - A vehicle spends 2 * (distance / speed + dwell) on each ride, plus
+#     energy / charger power charging for energy beyond its first battery,
+#     all before its last ride returns, so ride costs in vehicle-hours are
+#     bounded by the fleet's vehicle-hours (a fractional knapsack).
+#   - A ride counted in a peak hour window starts and is dropped off inside
+#     the window, and is dropped off no sooner than the fastest vehicle that
+#     can serve it could manage.
+
+
+def max_utility(u: Utility, low, high):
+    """Return the largest utility of a single attribute over [low, high]."""
+    points = [low, high] + [a for a in u.attribute if low < a < high]
+    return float(np.max(u.util(points)))
+
+
+def _knapsack(value, cost, capacity):
+    """Return the fractional knapsack value of items sorted by value/cost,
+    given cumulative value and cost arrays."""
+    n = np.searchsorted(cost, capacity, side="right")
+    total = value[n - 1] if n > 0 else 0.0
+    if n < len(cost):
+        previous = cost[n - 1] if n > 0 else 0.0
+        item = value[n] - (value[n - 1] if n > 0 else 0.0)
+        total += item * (capacity - previous) / (cost[n] - previous)
+    return total
+
+
+class _Designs:
+    """Per-ride bounds shared by every fleet with the same vehicle designs."""
+
+    def __init__(self, screen, vehicles):
+        sim, rides = screen.sim, screen.rides
+        distance = rides.distance
+        n = len(rides)
+
+        self.hours = []  # Vehicle-hours available per vehicle of each design
+        one_way = np.full(n, np.inf)  # Fastest one way time [hr]
+        cost = np.full(n, np.inf)  # Cheapest vehicle-hours per ride
+        last = rides.start_time.max(initial=0) + sim.max_wait
+        for v in vehicles:
+            rv = RealVehicle(v)
+            eligible = (rides.passengers <= rv.pax) & (rv.range() >= distance * 2)
+            t = distance / rv.speed + sim.dwell_time
+            energy = rv.power_consumption * distance * 2 / 1000  # [kWh]
+            c = 2 * t + energy / rv.charge_power
+
+            one_way = np.where(eligible, np.minimum(one_way, t), one_way)
+            cost = np.where(eligible, np.minimum(cost, c), cost)
+
+            # Busy until the last ride returns, plus the first battery
+            longest = 2 * t[eligible].max(initial=0)
+            self.hours.append(last + longest + rv.capacity / rv.charge_power)
+
+        served = np.isfinite(cost)
+        self.served = int(np.count_nonzero(served))
+
+        # Rides by passengers per vehicle-hour, for the volume bound
+        pax = rides.passengers[served].astype(float)
+        order = np.argsort(-pax / cost[served], kind="stable")
+        self.volume_pax = np.cumsum(pax[order])
+        self.volume_cost = np.cumsum(cost[served][order])
+
+        # Rides by vehicle-hours, for the completed ride count bound
+        self.count = np.arange(1.0, self.served + 1)
+        self.count_cost = np.cumsum(np.sort(cost[served]))
+
+        # Peak hour volume if every ride were served by its fastest vehicle,
+        # shared by designs that differ only in their charger or battery
+        key = (served.tobytes(), one_way[served].tobytes())
+        if key not in screen.peaks:
+            start = rides.start_time[served]
+            complete = start + one_way[served]
+            screen.peaks[key] = peak_volume(
+                start.tolist(), complete.tolist(), pax.tolist()
+            )
+        self.peak = screen.peaks[key]
+
+
+class Prescreen:
+    """Upper bounds on fleet utility, and a Pool map that skips fleets whose
+    bound a simulated fleet costing no more already reaches."""
+
+    sim: Simulation
+    rides: RideTable
+    mvu: MVU
+    skipped: int  # Fleets not simulated
+    costs: list[float]  # Cost/utility front of the simulated fleets, ascending
+    utilities: list[float]
+
+    def __init__(self, sim: Simulation, rides: RideTable, model: MVU = mvu):
+        self.sim = sim
+        self.rides = rides
+        self.mvu = model
+        self.skipped = 0
+        self.costs = []
+        self.utilities = []
+        self.designs = {}
+        self.peaks = {}
+
+    def bound(self, fleet: Fleet):
+        """Return an upper bound on the utility the fleet can achieve."""
+        key = tuple(v.design() for v in fleet.vehicles)
+        if key not in self.designs:
+            self.designs[key] = _Designs(self, fleet.vehicles)
+        d = self.designs[key]
+
+        hours = sum(h * q for h, q in zip(d.hours, fleet.quantities))
+        volume = _knapsack(d.volume_pax, d.volume_cost, hours)
+        completed = _knapsack(d.count, d.count_cost, hours)
+
+        u_volume, u_throughput, u_wait, u_availability = self.mvu.utilities
+        return float(
+            np.dot(
+                [
+                    max_utility(u_volume, 0, volume),
+                    max_utility(u_throughput, 0, d.peak),
+                    max_utility(u_wait, 0, self.sim.max_wait * 60),
+                    max_utility(u_availability, 0, completed / len(self.rides)),
+                ],
+                self.mvu.weights,
+            )
+        )
+
+    def best(self, cost):
+        """Return the highest simulated utility at or below a cost."""
+        i = bisect.bisect_right(self.costs, cost)
+        return self.utilities[i - 1] if i > 0 else -np.inf
+
+    def add(self, cost, utility):
+        """Record a simulated fleet's cost and utility."""
+        if utility <= self.best(cost):
+            return
+        # Drop the fleets it beats at the same or higher cost
+        i = bisect.bisect_left(self.costs, cost)
+        j = i
+        while j < len(self.costs) and self.utilities[j] <= utility:
+            j += 1
+        self.costs[i:j] = [cost]
+        self.utilities[i:j] = [utility]
+
+    def seed(self, costs, utilities):
+        """Record fleets simulated earlier, such as those of a resumed sweep."""
+        for c, u in zip(costs, utilities):
+            self.add(float(c), float(u))
+
+    def imap(self, pool, func, fleets, chunksize=1, batch=256, variants=False):
+        """Yield Results of `func` over the fleets that pass the screen.
+
+        Fleets are read `batch` at a time and each batch is simulated
+        cheapest first; a fleet is skipped when its bound does not exceed
+        the utility of a fleet costing no more from the batches already
+        completed. With `variants`, the fleets of a batch that share designs
+        are sent together and `func` is run_variants.
+        """
+        fleets = iter(fleets)
+        while True:
+            chunk = sorted(itertools.islice(fleets, batch), key=Fleet.cost)
+            if not chunk:
+                return
+
+            pending = []
+            for f in chunk:
+                if self.bound(f) <= self.best(f.cost()):
+                    self.skipped += 1
+                else:
+                    pending.append(f)
+
+            if variants:
+                results = itertools.chain.from_iterable(
+                    pool.imap_unordered(func, group_variants(pending), chunksize)
+                )
+            else:
+                results = pool.imap_unordered(func, pending, chunksize)
+            for r in results:
+                self.add(r.fleet_cost, r.utility)
+                yield r
@@ -0,0 +1,101 @@
+# Robaire Galliath
+# EM 411, Fall 2024
+
+from transport import Result, RideTable, Simulation
+from vehicle import Fleet
+import math
+import numpy as np
+
+######################################
+# Replications over Demand Scenarios #
+######################################
+
+# Each fleet is simulated against several independently seeded demand
+# scenarios. Replication r of every fleet uses the same scenario r (common
+# random numbers), so differences between fleets are not swamped by
+# differences between demand draws. A fleet stops replicating once the 95%
+# confidence interval of its utility is narrow enough.
+
+# Student's t 95% two-sided critical values for 1 to 30 degrees of freedom
+T95 = [
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+]  # fmt: skip
+
+
+class Replicated(Result):
+    """Mean Result of a fleet over replicated demand scenarios."""
+
+    total_requests: float
+    completed: float
+    dropped: float
+    impossible: float
+    pax_volume: float
+    pax_max: float
+    utility_std: float
+    utility_ci: float  # Half-width of the 95% confidence interval
+    replications: int
+
+    def __init__(self, results: list[Result]):
+        for name in Result.__annotations__:
+            values = [getattr(r, name) for r in results]
+            if isinstance(values[0], list):
+                setattr(self, name, values[0])
+            else:
+                setattr(self, name, float(np.mean(values)))
+
+        n = len(results)
+        utility = [r.utility for r in results]
+        self.utility_std = float(np.std(utility, ddof=1)) if n > 1 else math.inf
+        t = T95[n - 2] if 1 < n <= len(T95) + 1 else 1.96
+        self.utility_ci = t * self.utility_std / math.sqrt(n)
+        self.replications = n
+
+
+# Scenarios installed in each worker process by install_replicas
+_replicas: tuple[Simulation, list[RideTable]] = None
+
+
+def install_replicas(sim: Simulation, tables: list[RideTable]):
+    """Pool initializer that installs the simulator and every demand scenario
+    once per worker so tasks only carry a Fleet and a scenario index."""
+    global _replicas
+    _replicas = (sim, tables)
+
+
+def run_replica(args):
+    """Return a Result for a (fleet, scenario index) pair."""
+    fleet, r = args
+    sim, tables = _replicas
+    return sim.run((fleet, tables[r]))
+
+
+def replicate(
+    pool, fleets: list[Fleet], replications, precision=0.01, minimum=3, chunksize=1
+):
+    """Yield a Replicated summary of each fleet, in order of completion.
+
+    Every fleet starts with `minimum` replications and gains one per round
+    until its utility confidence interval half-width is within `precision`
+    or it has run all `replications` scenarios.
+    """
+    fleets = list(fleets)
+    results = [[] for _ in fleets]
+    active = list(range(len(fleets)))
+    n = min(minimum, replications)
+    while active:
+        tasks = [(i, r) for i in active for r in range(len(results[i]), n)]
+        args = [(fleets[i], r) for i, r in tasks]
+        for (i, _), result in zip(tasks, pool.imap(run_replica, args, chunksize)):
+            results[i].append(result)
+
+        remaining = []
+        for i in active:
+            summary = Replicated(results[i])
+            if summary.utility_ci <= precision or n >= replications:
+                yield summary
+            else:
+                remaining.append(i)
+        active = remaining
+        n += 1
@@ -0,0 +1,88 @@
+# Robaire Galliath
+# EM 411, Fall 2024
+
+from mvu import MVU, Utility
+from pareto import pareto_front
+from results import load_frame
+import transport
+import numpy as np
+import pandas as pd
+import sys
+
+#############################################
+# Re-score Stored Sweeps Without Re-running #
+#############################################
+
+# Raw Result attributes, in the order the MVU expects them
+ATTRIBUTES = ["pax_volume", "pax_max", "average_wait", "availability"]
+
+
+def rescore(columns, alternatives: dict[str, MVU]):
+    """Return {name: utility array} for each alternative MVU definition,
+    given stored result columns.
+
+    Single attribute curves shared between alternatives are interpolated
+    once, and every alternative is weighted in a single matrix product.
+    """
+    attributes = np.column_stack([columns[a] for a in ATTRIBUTES])
+
+    curves = {}  # (attribute, curve) -> score column
+    scores = []
+    terms = []  # (score column, alternative, weight)
+    for j, m in enumerate(alternatives.values()):
+        for i, (u, w) in enumerate(zip(m.utilities, m.weights)):
+            curve = (i, tuple(u.attribute), tuple(u.utility))
+            if curve not in curves:
+                curves[curve] = len(scores)
+                scores.append(u.util(attributes[:, i]))
+            terms.append((curves[curve], j, w))
+
+    weights = np.zeros((len(scores), len(alternatives)))
+    for c, j, w in terms:
+        weights[c, j] += w
+
+    utility = np.column_stack(scores) @ weights
+    return {name: utility[:, j] for j, name in enumerate(alternatives)}
+
+
+def rescore_fronts(columns, alternatives: dict[str, MVU]):
+    """Return {name: (utility, Pareto front mask)} for each alternative."""
+    return {
+        name: (utility, pareto_front(columns["fleet_cost"], utility))
+        for name, utility in rescore(columns, alternatives).items()
+    }
+
+
+# Example sensitivity study: a stricter wait time curve and alternate weights
+mvu_wait_strict = Utility([0, 2, 5, 10, 15, 20], [1.0, 0.9, 0.6, 0.3, 0.1, 0])
+ALTERNATIVES = {
+    "baseline": transport.mvu,
+    "strict_wait": MVU(
+        [
+            transport.mvu_volume,
+            transport.mvu_throughput,
+            mvu_wait_strict,
+            transport.mvu_availability,
+        ],
+        transport.mvu_weights,
+    ),
+    "throughput": MVU(transport.mvu_utilities, [0.15, 0.45, 0.2, 0.2]),
+    "availability": MVU(transport.mvu_utilities, [0.1, 0.2, 0.3, 0.4]),
+}
+
+
+if __name__ == "__main__":
+
+    # Usage: python rescore.py [results.csv|.npz ...]
+    paths = sys.argv[1:] or ["./Q4/singles.csv", "./Q4/pairs.csv"]
+    data = pd.concat([load_frame(p) for p in paths], ignore_index=True)
+
+    for name, (utility, front) in rescore_fronts(data, ALTERNATIVES).items():
+        data[f"utility_{name}"] = utility
+        data[f"pareto_{name}"] = front
+        best = np.argmax(utility)
+        print(
+            f"{name}: {np.count_nonzero(front)} on the front, best utility {utility[best]:.3f} at ${data['fleet_cost'][best]:,.0f}"
+        )
+
+    data.to_csv("rescored.csv", index=False)
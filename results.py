@@ -0,0 +1,378 @@
+# Robaire Galliath
+# EM 411, Fall 2024
+
+import ast
+import csv
+import hashlib
+import os
+import numpy as np
+from transport import EventSimulation, Result, RideTable, Simulation
+from vehicle import Fleet
+
+
+def scenario_hash(sim: Simulation, rides: RideTable):
+    """Return a digest of the simulator parameters and ride requests."""
+    h = hashlib.sha1()
+    h.update(
+        repr(
+            (
+                sim.max_wait,
+                sim.availability,
+                sim.dwell_time,
+                sim.charge_distance,
+                sim.charge_time_penalty,
+            )
+        ).encode()
+    )
+    if isinstance(sim, EventSimulation):
+        h.update(repr(sim.chargers).encode())
+    for column in (rides.distance, rides.passengers, rides.start_time):
+        h.update(np.ascontiguousarray(column, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+def fleet_key(designs: list[str], quantities: list[int], scenario: str):
+    """Return a stable key for a fleet configuration under a scenario."""
+    text = ";".join([scenario] + [f"{d} x{q}" for d, q in zip(designs, quantities)])
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+class ResultWriter:
+    """Write Results to a CSV file one row at a time as they arrive.
+
+    Rows are flushed as they are written so an interrupted sweep keeps every
+    result completed so far. Given a scenario hash, each row also records its
+    fleet key and the scenario, and reopening the file resumes it: rows from
+    other scenarios are discarded and `done()` reports fleets that already
+    have a row.
+    """
+
+    path: str
+    scenario: str
+    count: int  # Rows written
+    skipped: int  # Fleets skipped because they already have a row
+
+    def __init__(self, path, scenario=None):
+        self.path = path
+        self.scenario = scenario
+        self.count = 0
+        self.skipped = 0
+        self.keys = set()
+        self.kept = []  # Rows resumed from the file
+        self.header = None
+        self.file = None
+        self.writer = None
+
+    def __enter__(self):
+        if self.scenario is not None and os.path.exists(self.path):
+            self._resume()
+        else:
+            self.file = open(self.path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        return self
+
+    def __exit__(self, *exc):
+        self.file.close()
+
+    def _resume(self):
+        """Load completed rows for this scenario and reopen for appending."""
+        with open(self.path, newline="") as f:
+            content = f.read()
+
+        # A partial last line means the previous run was killed mid-write
+        complete, _, partial = content.rpartition("\n")
+        rows = list(csv.reader(complete.splitlines())) if complete else []
+
+        header = rows[0] if rows else []
+        kept = []
+        if "key" in header and "scenario" in header:
+            scenario = header.index("scenario")
+            kept = [r for r in rows[1:] if r[scenario] == self.scenario]
+            self.keys = {r[header.index("key")] for r in kept}
+            self.kept = kept
+
+        if partial or len(kept) != len(rows) - 1:
+            # Rewrite the file with only the rows that are still valid
+            self.file = open(self.path, "w", newline="")
+            if kept:
+                csv.writer(self.file).writerows([header] + kept)
+                self.header = header
+        else:
+            self.file = open(self.path, "a", newline="")
+            self.header = header if kept else None
+
+    def done(self, fleet: Fleet):
+        """Return True if the fleet already has a row in this scenario."""
+        designs = [v.design() for v in fleet.vehicles]
+        if fleet_key(designs, fleet.quantities, self.scenario) in self.keys:
+            self.skipped += 1
+            return True
+        return False
+
+    def stored(self):
+        """Return the fleet costs and utilities of the resumed rows."""
+        if not self.kept:
+            return np.zeros(0), np.zeros(0)
+        rows = np.array(self.kept)
+        return (
+            rows[:, self.header.index("fleet_cost")].astype(float),
+            rows[:, self.header.index("utility")].astype(float),
+        )
+
+    def write(self, result: Result):
+        """Append a Result, writing the headers before the first row."""
+        row = vars(result)
+        if self.scenario is not None:
+            key = fleet_key(result.vehicles, result.vehicle_quantities, self.scenario)
+            row = row | {"key": key, "scenario": self.scenario}
+            self.keys.add(key)
+
+        if self.header is None:
+            self.header = list(row.keys())
+            self.writer.writerow(self.header)
+        self.writer.writerow(row.values())
+        self.file.flush()
+        self.count += 1
+
+
+def _kinds(result_type=Result):
+    """Return the field annotations of a Result class, including its bases."""
+    kinds = {}
+    for cls in reversed(result_type.__mro__):
+        kinds |= cls.__dict__.get("__annotations__", {})
+    return kinds
+
+
+def _empty(kind, rows, slots):
+    """Return an empty column for a Result field annotation."""
+    if kind in (list[str], list[int], list[float]):
+        shape = (rows, slots)
+    else:
+        shape = rows
+
+    if kind in (list[str], str):
+        return np.full(shape, "", dtype="U64")
+    if kind is bytes:
+        return np.full(shape, b"", dtype="S40")  # Hex SHA-1 fleet keys
+    if kind in (list[int], int):
+        return np.zeros(shape, dtype=np.int64)
+    return np.full(shape, np.nan)
+
+
+def _chunks(path):
+    """Return the chunk files of a ResultStore directory in order."""
+    names = os.listdir(path) if os.path.isdir(path) else []
+    return sorted(
+        os.path.join(path, n)
+        for n in names
+        if n.startswith("chunk-") and not n.endswith(".partial.npz")
+    )
+
+
+class ResultStore:
+    """Write Results to a directory of NumPy .npz chunks of typed columns.
+
+    Each Result field becomes one array. List fields are stored in `slots`
+    fixed columns per row, padded with empty strings, zero quantities, and
+    NaN. Rows are buffered and every `save_every` rows are written as a new
+    chunk, so finished chunks are never rewritten. The scenario hash is
+    stored once in `meta.npz` and each row records only its fleet key.
+    Reopening the store resumes it like ResultWriter: rows of another
+    scenario are discarded, and columns that do not match the fields and
+    slots raise ValueError. Subclasses of Result may be stored by passing
+    their class as `result_type`.
+    """
+
+    path: str
+    scenario: str
+    slots: int  # Vehicle types per row
+    count: int  # Rows written
+    skipped: int  # Fleets skipped because they already have a row
+
+    def __init__(
+        self, path, scenario=None, slots=2, save_every=256, result_type=Result
+    ):
+        self.path = path
+        self.scenario = scenario
+        self.slots = slots
+        self.save_every = save_every
+        self.count = 0
+        self.skipped = 0
+        self.keys = set()
+        self.size = 0  # Rows in the buffer
+        self.chunk = 0  # Number of the next chunk
+        self.kept = (np.zeros(0), np.zeros(0))  # Resumed costs and utilities
+        self.kinds = _kinds(result_type)
+        if scenario is not None:
+            self.kinds |= {"key": bytes}
+        self.columns = {
+            k: _empty(kind, save_every, slots) for k, kind in self.kinds.items()
+        }
+
+    def __enter__(self):
+        os.makedirs(self.path, exist_ok=True)
+        meta = os.path.join(self.path, "meta.npz")
+        if self.scenario is not None and os.path.exists(meta):
+            stored = load_results(self.path)
+            self._check(stored)
+            with np.load(meta) as data:
+                scenario = str(data["scenario"])
+            if scenario == self.scenario:
+                self.chunk = len(_chunks(self.path))
+                self.kept = (stored["fleet_cost"], stored["utility"])
+                self.keys = {k.decode() for k in stored["key"].tolist()}
+                return self
+
+        # Start over, discarding rows of any other scenario
+        for chunk in _chunks(self.path):
+            os.remove(chunk)
+        partial = os.path.join(self.path, "meta.partial.npz")
+        np.savez(partial, scenario=self.scenario or "", slots=self.slots)
+        os.replace(partial, meta)
+        return self
+
+    def __exit__(self, *exc):
+        self.save()
+
+    def _check(self, stored):
+        """Raise ValueError unless stored columns match this store's fields,
+        types, and slots."""
+        if set(stored) != set(self.kinds):
+            missing = sorted(set(self.kinds) - set(stored))
+            extra = sorted(set(stored) - set(self.kinds))
+            raise ValueError(
+                f"{self.path} does not match the result fields: "
+                f"missing {missing}, unexpected {extra}"
+            )
+        rows = len(stored["key"])
+        for name, kind in self.kinds.items():
+            expected = _empty(kind, 0, self.slots)
+            column = stored[name]
+            if len(column) != rows:
+                raise ValueError(f"{self.path} has columns of different lengths")
+            if column.dtype.kind != expected.dtype.kind:
+                raise ValueError(
+                    f"{self.path} stores {name} as {column.dtype}, "
+                    f"expected {expected.dtype}"
+                )
+            if column.shape[1:] != expected.shape[1:]:
+                raise ValueError(
+                    f"{self.path} stores {name} with shape {column.shape[1:]}, "
+                    f"expected {expected.shape[1:]} for {self.slots} slots"
+                )
+
+    def done(self, fleet: Fleet):
+        """Return True if the fleet already has a row in this scenario."""
+        designs = [v.design() for v in fleet.vehicles]
+        if fleet_key(designs, fleet.quantities, self.scenario) in self.keys:
+            self.skipped += 1
+            return True
+        return False
+
+    def stored(self):
+        """Return the fleet costs and utilities of the resumed rows."""
+        return self.kept
+
+    def write(self, result: Result):
+        """Append a Result, saving a chunk every `save_every` rows."""
+        if len(result.vehicles) > self.slots:
+            raise ValueError(
+                f"Fleet has {len(result.vehicles)} vehicle types but the store has {self.slots} slots"
+            )
+
+        row = vars(result)
+        if self.scenario is not None:
+            key = fleet_key(result.vehicles, result.vehicle_quantities, self.scenario)
+            row = row | {"key": key.encode()}
+            self.keys.add(key)
+
+        for name, value in row.items():
+            if isinstance(value, list):
+                self.columns[name][self.size, : len(value)] = value
+            else:
+                self.columns[name][self.size] = value
+        self.size += 1
+        self.count += 1
+
+        if self.size == self.save_every:
+            self.save()
+
+    def save(self):
+        """Write the buffered rows as the next chunk and empty the buffer."""
+        if self.size == 0:
+            return
+        name = os.path.join(self.path, f"chunk-{self.chunk:06d}")
+        partial = f"{name}.partial.npz"
+        np.savez(partial, **{k: v[: self.size] for k, v in self.columns.items()})
+        os.replace(partial, f"{name}.npz")
+        self.chunk += 1
+        self.size = 0
+        for name, kind in self.kinds.items():
+            self.columns[name] = _empty(kind, self.save_every, self.slots)
+
+
+def open_results(path, scenario=None, slots=2, result_type=Result):
+    """Return a ResultStore for .npz paths, otherwise a ResultWriter."""
+    if path.endswith(".npz"):
+        return ResultStore(path, scenario, slots, result_type=result_type)
+    return ResultWriter(path, scenario)
+
+
+def load_results(path, result_type=Result):
+    """Return a dict of column arrays from a ResultStore or a results CSV.
+
+    CSV list columns are parsed into fixed slot columns so both formats load
+    into the same layout, with column types from `result_type`.
+    """
+    if os.path.isdir(path):
+        parts = {}
+        for chunk in _chunks(path):
+            with np.load(chunk) as data:
+                for name in data.files:
+                    parts.setdefault(name, []).append(data[name])
+        if not parts:
+            with np.load(os.path.join(path, "meta.npz")) as data:
+                kinds = _kinds(result_type)
+                if str(data["scenario"]):
+                    kinds |= {"key": bytes}
+                slots = int(data["slots"])
+            return {k: _empty(kind, 0, slots) for k, kind in kinds.items()}
+        return {name: np.concatenate(p) for name, p in parts.items()}
+
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))
+    header, rows = rows[0], rows[1:]
+
+    kinds = _kinds(result_type)
+    columns = {}
+    for i, name in enumerate(header):
+        values = [r[i] for r in rows]
+        kind = kinds.get(name, str)
+        if kind in (list[str], list[int], list[float]):
+            lists = [ast.literal_eval(v) for v in values]
+            column = _empty(kind, len(lists), max(len(v) for v in lists))
+            for j, v in enumerate(lists):
+                column[j, : len(v)] = v
+        elif kind is str:
+            column = np.array(values, dtype="U64")
+        else:
+            column = np.array(values, dtype=float).astype(_empty(kind, 0, 0).dtype)
+        columns[name] = column
+    return columns
+
+
+def load_frame(path, result_type=Result):
+    """Return results as a pandas DataFrame with one column per vehicle slot
+    (`vehicles_0`, `vehicles_1`, ...) and the total `fleet_size`."""
+    import pandas as pd
+
+    columns = load_results(path, result_type)
+    frame = {}
+    for name, column in columns.items():
+        if column.ndim == 2:
+            for i in range(column.shape[1]):
+                frame[f"{name}_{i}"] = column[:, i]
+        else:
+            frame[name] = column
+    frame["fleet_size"] = columns["vehicle_quantities"].sum(axis=1)
+    return pd.DataFrame(frame)
@@ -0,0 +1,77 @@
+# Robaire Galliath
+# EM 411, Fall 2024
+
+from vehicle import _Vehicle, Fleet
+import math
+
+############################
+# Adaptive Quantity Search #
+############################
+
+# Instead of simulating every quantity on a fixed grid, each design's
+# cost/utility curve is traced by bisection. Fleet cost is linear in the
+# quantity, so an interval is split only where the utility at its midpoint
+# strays from the straight line between its ends, i.e. where utility per
+# dollar changes. A design starts from its lowest, middle, and highest
+# quantities, and intervals are not split below the grid step, so a design
+# never costs more simulations than its grid. Every design's midpoints at
+# one level are simulated together, so the Pool stays busy.
+
+
+def quantity_limit(vehicle: _Vehicle, low, high, cost_cap=math.inf):
+    """Return the largest quantity in [low, high] within the cost cap, or
+    None if even `low` vehicles cost too much."""
+    while high >= low and Fleet([vehicle], [high]).cost() > cost_cap:
+        high -= 1
+    return high if high >= low else None
+
+
+def search(
+    pool,
+    func,
+    designs: list[tuple[_Vehicle, int, int, int]],
+    tolerance=0.01,
+    chunksize=1,
+    cost_cap=math.inf,
+):
+    """Yield Results of `func` tracing each design's quantity/utility curve.
+
+    `designs` holds (vehicle, low, high, step) quantity grids. Each grid
+    within the cost cap starts as its ends and midpoint, then an interval is bisected while its
+    midpoint utility differs from the chord by more than `tolerance` and
+    its halves are at least `step` vehicles wide.
+    """
+    curves = []  # {quantity: utility} for each design
+    level = []  # (design, quantity) to simulate next
+    intervals = []  # (design, low, high) whose midpoints are in `level`
+    for d, (vehicle, low, high, step) in enumerate(designs):
+        curves.append({})
+        high = quantity_limit(vehicle, low, high, cost_cap)
+        if high is None:
+            continue
+        high -= (high - low) % step  # Highest grid quantity
+        level += [(d, q) for q in sorted({low, high})]
+        if high - low >= 2 * step:
+            level.append((d, (low + high) // 2))
+            intervals.append((d, low, high))
+
+    while level:
+        fleets = [Fleet([designs[d][0]], [q]) for d, q in level]
+        for (d, q), r in zip(level, pool.imap(func, fleets, chunksize)):
+            curves[d][q] = r.utility
+            yield r
+
+        # Split intervals whose midpoints are off the chord
+        level = []
+        split = []
+        for d, low, high in intervals:
+            u = curves[d]
+            middle = (low + high) // 2
+            chord = u[low] + (u[high] - u[low]) * (middle - low) / (high - low)
+            if abs(u[middle] - chord) <= tolerance:
+                continue
+            for a, b in [(low, middle), (middle, high)]:
+                if b - a >= 2 * designs[d][3]:
+                    level.append((d, (a + b) // 2))
+                    split.append((d, a, b))
+        intervals = split
@@ -0,0 +1,146 @@
+# Robaire Galliath
+# EM 411, Fall 2024
+
+import numpy as np
+import os
+
+###########################
+# Simulation Event Traces #
+###########################
+
+# Simulation.run(args, trace=recorder) records every assignment, drop, and
+# charge into a preallocated structured buffer, written to disk whenever it
+# fills. A trace file is a 16 byte header followed by raw EVENT records, so
+# Trace reads it back through np.memmap without loading it into memory.
+#
+# Vehicle ids index the fleet's vehicles in order, each design repeated by
+# its quantity. Ride ids index the ride table. Times are in hours.
+
+MAGIC = b"EM411TRC"
+VERSION = 1
+HEADER = 16  # [bytes] magic, version, record size
+
+# Event kinds
+ASSIGNED = 0  # time: ride filled, until: vehicle back at the hub
+DROPPED = 1  # time: ride requested, until: first time a vehicle was free
+CHARGING = 2  # time: charge started, until: vehicle available again
+QUEUED = 3  # time: vehicle joined the charger queue, until: nan
+KINDS = ["assigned", "dropped", "charging", "queued"]
+
+EVENT = np.dtype(
+    [
+        ("kind", np.uint8),
+        ("vehicle", np.int32),  # -1 if no vehicle was involved
+        ("ride", np.int32),  # -1 if no ride was involved
+        ("time", np.float64),  # [hr]
+        ("until", np.float64),  # [hr]
+        ("battery", np.float64),  # Battery charge after the event [kWh]
+    ]
+)
+
+
+class TraceRecorder:
+    """Writes simulation events to a trace file."""
+
+    path: str
+    count: int  # Events recorded
+
+    def __init__(self, path, capacity=65536):
+        self.path = path
+        self.count = 0
+        self.buffer = np.zeros(capacity, dtype=EVENT)
+        self.filled = 0  # Events in the buffer
+        self.file = open(path, "wb")
+        self.file.write(MAGIC)
+        self.file.write(np.array([VERSION, EVENT.itemsize], dtype="<u4").tobytes())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, kind, vehicle, ride, time, until, battery):
+        """Add an event, writing the buffer out if it is full."""
+        self.buffer[self.filled] = (kind, vehicle, ride, time, until, battery)
+        self.filled += 1
+        self.count += 1
+        if self.filled == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        """Write the buffered events to the trace file."""
+        self.buffer[: self.filled].tofile(self.file)
+        self.filled = 0
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class Trace:
+    """Read-only view of a trace file. Events are memory-mapped, so only the
+    pages that are touched are read from disk."""
+
+    path: str
+    events: np.memmap
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(HEADER)
+        if header[:8] != MAGIC:
+            raise ValueError(f"{path} is not a trace file")
+        version, size = np.frombuffer(header[8:], dtype="<u4")
+        if version != VERSION or size != EVENT.itemsize:
+            raise ValueError(f"{path} has an unsupported trace version {version}")
+
+        if os.path.getsize(path) == HEADER:
+            self.events = np.zeros(0, dtype=EVENT)
+        else:
+            self.events = np.memmap(path, dtype=EVENT, mode="r", offset=HEADER)
+
+    def __len__(self):
+        return len(self.events)
+
+    def chunks(self, size=65536):
+        """Yield the events in order, `size` at a time."""
+        for start in range(0, len(self.events), size):
+            yield self.events[start : start + size]
+
+    def select(self, kind=None, vehicle=None, ride=None, start=0, stop=np.inf):
+        """Return the events matching every given filter, with `time` in
+        [start, stop), read a chunk at a time."""
+        selected = []
+        for chunk in self.chunks():
+            mask = (chunk["time"] >= start) & (chunk["time"] < stop)
+            if kind is not None:
+                mask &= chunk["kind"] == kind
+            if vehicle is not None:
+                mask &= chunk["vehicle"] == vehicle
+            if ride is not None:
+                mask &= chunk["ride"] == ride
+            selected.append(np.asarray(chunk[mask]))
+        return np.concatenate(selected) if selected else np.zeros(0, dtype=EVENT)
+
+    def counts(self):
+        """Return the number of events of each kind, by name."""
+        counts = np.zeros(len(KINDS), dtype=np.int64)
+        for chunk in self.chunks():
+            counts += np.bincount(chunk["kind"], minlength=len(KINDS))
+        return dict(zip(KINDS, counts.tolist()))
+
+    def vehicles(self, time):
+        """Replay the trace up to `time` and return the state of each vehicle
+        that has an event by then, as {vehicle: (busy until, battery)}."""
+        state = {}
+        for chunk in self.chunks():
+            chunk = chunk[(chunk["time"] <= time) & (chunk["vehicle"] >= 0)]
+            for v, until, battery in zip(
+                chunk["vehicle"].tolist(),
+                chunk["until"].tolist(),
+                chunk["battery"].tolist(),
+            ):
+                state[v] = (until, battery)
+        return state
@@ -2,8 +2,18 @@
 # EM 411, Fall 2024
 
 
+import bisect
+import heapq
+import itertools
+import math
+import numpy as np
+import os
+import pickle
+import time
+from collections import deque
 from dataclasses import dataclass
 from mvu import MVU, Utility
+from tracing import ASSIGNED, CHARGING, DROPPED, QUEUED, TraceRecorder
 from vehicle import _Vehicle, Fleet
 
 # Single Variate Utility Functions
@@ -18,32 +28,55 @@ mvu = MVU(mvu_utilities, mvu_weights)
 
 # Class for tracking vehicle state
 class RealVehicle:
+    __slots__ = (
+        "vehicle",
+        "pax",
+        "capacity",
+        "power_consumption",
+        "speed",
+        "charge_power",
+        "battery_capacity",
+        "next_available",
+    )
+
     vehicle: _Vehicle
+    pax: int  # Passenger capacity
+    capacity: float  # Full battery capacity [kWh]
+    power_consumption: float  # [Wh/km]
+    speed: float  # [km/hr]
+    charge_power: float  # [kW]
     battery_capacity: float  # Current battery charge [kWh]
-    next_available: float = 0  # The time this vehicle becomes available [hr]
+    next_available: float  # The time this vehicle becomes available [hr]
 
     def __init__(self, vehicle):
         self.vehicle = vehicle
-        self.battery_capacity = self.vehicle.battery.capacity
+
+        # Vehicles do not change once built, so derived values are fixed here
+        self.pax = vehicle.chassis.pax
+        self.capacity = vehicle.battery.capacity
+        self.power_consumption = vehicle.power_consumption()
+        self.speed = vehicle.speed()
+        self.charge_power = vehicle.charger.power
+
+        self.battery_capacity = self.capacity
+        self.next_available = 0
 
     def range(self):
         """Current range [km]."""
-        return (self.battery_capacity * 1000) / self.vehicle.power_consumption()
+        return (self.battery_capacity * 1000) / self.power_consumption
 
     def move(self, distance):
         """Decrease the battery capacity for a distance traveled in km."""
-        self.battery_capacity -= (self.vehicle.power_consumption() * distance) / 1000
+        self.battery_capacity -= (self.power_consumption * distance) / 1000
         return self.battery_capacity
 
     def charge_time(self):
         """Time to charge from current capacity to full [hr]"""
-        return (
-            self.vehicle.battery.capacity - self.battery_capacity
-        ) / self.vehicle.charger.power
+        return (self.capacity - self.battery_capacity) / self.charge_power
 
 
 # For tracking ride state
-@dataclass
+@dataclass(slots=True)
 class Ride:
     distance: float  # One way ride distance
     passengers: int  # Passenger count
@@ -60,6 +93,107 @@ class Ride:
         return self.complete_time - self.filled_time
 
 
+def peak_volume(start_times, complete_times, passengers, window=1):
+    """Return the peak passenger volume within a time window [pax].
+
+    For each ride, sums the passengers of rides that start after it and are
+    complete within `window` hours of its start time, and returns the
+    largest sum. Uses a Fenwick tree over completion times, O(n log n).
+    """
+    n = len(start_times)
+    ends = sorted(complete_times)
+    tree = [0] * (n + 1)  # Passenger sums indexed by completion rank
+
+    # Sweep rides from the latest start, adding every ride that starts
+    # strictly after the current one before querying its window
+    order = sorted(range(n), key=lambda i: start_times[i], reverse=True)
+    peak = 0
+    j = 0
+    for i in order:
+        while j < n and start_times[order[j]] > start_times[i]:
+            k = order[j]
+            pos = bisect.bisect_left(ends, complete_times[k]) + 1
+            while pos <= n:
+                tree[pos] += passengers[k]
+                pos += pos & -pos
+            j += 1
+
+        pos = bisect.bisect_right(ends, start_times[i] + window)
+        pax = 0
+        while pos > 0:
+            pax += tree[pos]
+            pos -= pos & -pos
+        peak = max(pax, peak)
+
+    return peak
+
+
+class RideTable:
+    """Columnar table of ride requests.
+
+    The demand columns (distance, passengers, start_time) are read-only and
+    shared between runs; `fresh()` returns a table with its own filled and
+    complete time columns for a single run.
+    """
+
+    distance: np.ndarray  # One way ride distance [km]
+    passengers: np.ndarray  # Passenger count
+    start_time: np.ndarray  # When the request begins [hr]
+    filled_time: np.ndarray  # When the request is filled [hr]
+    complete_time: np.ndarray  # When the ride is completed [hr]
+
+    def __init__(
+        self, distance, passengers, start_time, filled_time=None, complete_time=None
+    ):
+        self.distance = _readonly(np.asarray(distance, dtype=float))
+        self.passengers = _readonly(np.asarray(passengers, dtype=int))
+        self.start_time = _readonly(np.asarray(start_time, dtype=float))
+
+        n = len(self.start_time)
+        if len(self.distance) != n or len(self.passengers) != n:
+            raise ValueError("Ride columns must have the same length")
+
+        self.filled_time = (
+            np.full(n, -1.0) if filled_time is None else np.asarray(filled_time)
+        )
+        self.complete_time = (
+            np.full(n, -1.0) if complete_time is None else np.asarray(complete_time)
+        )
+
+    @classmethod
+    def from_rides(cls, rides: list[Ride]):
+        """Return a table built from a list of rides."""
+        return cls(
+            [r.distance for r in rides],
+            [r.passengers for r in rides],
+            [r.start_time for r in rides],
+            [r.filled_time for r in rides],
+            [r.complete_time for r in rides],
+        )
+
+    def __len__(self):
+        return len(self.start_time)
+
+    def fresh(self):
+        """Return a table sharing the demand columns with unfilled rides."""
+        return RideTable(self.distance, self.passengers, self.start_time)
+
+    def wait_time(self):
+        """Wait time [hr]."""
+        return self.filled_time - self.start_time
+
+    def travel_time(self):
+        """Travel time [hr]."""
+        return self.complete_time - self.filled_time
+
+
+def _readonly(column: np.ndarray):
+    """Return a read-only view of a column."""
+    view = column.view()
+    view.flags.writeable = False
+    return view
+
+
 class Result:
     vehicles: list[str]
     vehicle_quantities: list[int]
@@ -83,10 +217,11 @@ class Result:
 
     def __init__(
         self,
-        rides: list[Ride],
+        rides: RideTable,
         vehicles: list[RealVehicle],
         fleet: Fleet,
         availability: float,
+        pax_max: int = None,  # Peak volume, if already computed
     ):
         self.vehicles = [v.design() for v in fleet.vehicles]
         self.vehicle_quantities = fleet.quantities
@@ -96,46 +231,43 @@ class Result:
 
         self.total_requests = len(rides)
 
-        completed = [r for r in rides if r.complete_time > 0.0]
-        self.completed = len(completed)
+        completed = rides.complete_time > 0.0
+        self.completed = int(np.count_nonzero(completed))
 
-        dropped = [r for r in rides if r.complete_time == -2.0]
-        self.dropped = len(dropped)
+        dropped = rides.complete_time == -2.0
+        self.dropped = int(np.count_nonzero(dropped))
 
-        impossible = [r for r in rides if r.complete_time == -1.0]
-        self.impossible = len(impossible)
+        impossible = rides.complete_time == -1.0
+        self.impossible = int(np.count_nonzero(impossible))
 
-        if len(rides) != len(completed) + len(dropped) + len(impossible):
+        if len(rides) != self.completed + self.dropped + self.impossible:
             print(
-                f"Rides: {len(rides)}, C: {len(completed)}, D: {len(dropped)}, I: {len(impossible)}, SUM: {len(completed) + len(dropped) + len(impossible)}"
+                f"Rides: {len(rides)}, C: {self.completed}, D: {self.dropped}, I: {self.impossible}, SUM: {self.completed + self.dropped + self.impossible}"
             )
 
-        self.pax_volume = sum([r.passengers for r in completed])
+        self.pax_volume = int(rides.passengers[completed].sum())
 
-        wait_times = [r.wait_time() * 60 for r in completed]  # [min]
-        self.average_wait = sum(wait_times) / len(wait_times)
-        self.max_wait = max(wait_times)
+        wait_times = rides.wait_time()[completed] * 60  # [min]
+        self.average_wait = float(wait_times.sum()) / len(wait_times)
+        self.max_wait = float(wait_times.max())
 
-        trip_times = [r.travel_time() * 60 for r in completed]
-        self.average_duration = sum(trip_times) / len(trip_times)
+        trip_times = rides.travel_time()[completed] * 60
+        self.average_duration = float(trip_times.sum()) / len(trip_times)
 
-        trip_dist = [r.distance for r in completed]
-        self.average_distance = sum(trip_dist) / len(trip_dist)
+        trip_dist = rides.distance[completed]
+        self.average_distance = float(trip_dist.sum()) / len(trip_dist)
 
-        self.availability = len([w for w in wait_times if w < availability]) / len(
+        self.availability = int(np.count_nonzero(wait_times < availability)) / len(
             rides
         )
 
         # Search for the hour window with the highest pax volume
-        pax_max = 0
-        for ride in completed:
-            pax = [
-                r.passengers
-                for r in completed
-                if r.start_time > ride.start_time
-                and r.complete_time <= ride.start_time + 1
-            ]
-            pax_max = max(sum(pax), pax_max)
+        if pax_max is None:
+            pax_max = peak_volume(
+                rides.start_time[completed].tolist(),
+                rides.complete_time[completed].tolist(),
+                rides.passengers[completed].tolist(),
+            )
 
         self.pax_max = pax_max
         # self.pax_max = fleet.pax_throughput(1.5)
@@ -146,6 +278,126 @@ class Result:
 
         self.fleet_cost = fleet.cost()
 
+    @classmethod
+    def from_totals(cls, designs, quantities, total_requests, totals):
+        """Return a Result from each vehicle's (design, cost, range, speed)
+        and the ride totals of the array kernel (see kernel._totals)."""
+        self = cls.__new__(cls)
+        self.vehicles = [d[0] for d in designs]
+        self.vehicle_quantities = quantities
+        self.vehicle_costs = [d[1] for d in designs]
+        self.vehicle_ranges = [d[2] for d in designs]
+        self.vehicle_speeds = [d[3] for d in designs]
+
+        self.total_requests = total_requests
+        (
+            self.completed,
+            self.dropped,
+            self.impossible,
+            self.pax_volume,
+            self.pax_max,
+            wait,
+            self.max_wait,
+            duration,
+            distance,
+            available,
+        ) = totals
+        self.average_wait = wait / self.completed
+        self.average_duration = duration / self.completed
+        self.average_distance = distance / self.completed
+        self.availability = available / total_requests
+
+        self.utility = mvu.evaluate(
+            [self.pax_volume, self.pax_max, self.average_wait, self.availability]
+        )
+        self.fleet_cost = sum([c * q for c, q in zip(self.vehicle_costs, quantities)])
+        return self
+
+
+def _lap(timings: dict, phase: str, clock: float):
+    """Add the seconds since `clock` to a phase and return the new clock."""
+    now = time.perf_counter()
+    timings[phase] = timings.get(phase, 0.0) + now - clock
+    return now
+
+
+class Dispatcher:
+    """Priority queues of vehicles ordered by availability, charge, and seats.
+
+    Vehicles are bucketed by passenger capacity so a ride only searches the
+    buckets with enough seats. Each bucket is a heap keyed by
+    (next_available, battery_capacity, pax) with the fleet index as a
+    tie-breaker, matching a stable sort of the fleet.
+    """
+
+    buckets: dict[int, list[tuple[float, float, int, int, RealVehicle]]]
+    capacities: list[int]  # Sorted bucket keys [pax]
+
+    def __init__(self, vehicles: list[RealVehicle]):
+        self.buckets = {}
+        for i, v in enumerate(vehicles):
+            self.buckets.setdefault(v.pax, [])
+            self.push(i, v)
+        self.capacities = sorted(self.buckets)
+
+    def push(self, index: int, vehicle: RealVehicle):
+        """Return a vehicle to its queue after its state has been updated."""
+        pax = vehicle.pax
+        heapq.heappush(
+            self.buckets[pax],
+            (vehicle.next_available, vehicle.battery_capacity, pax, index, vehicle),
+        )
+
+    def pop(self, passengers, distance, now=math.inf):
+        """Remove and return (index, vehicle) for the first vehicle able to
+        complete a round trip of the ride, or None if no vehicle can by
+        `now`."""
+        best = None
+        for pax in self.capacities[bisect.bisect_left(self.capacities, passengers) :]:
+            heap = self.buckets[pax]
+
+            # Find the first vehicle in this bucket with enough range
+            skipped = []
+            candidate = None
+            while heap:
+                entry = heapq.heappop(heap)
+                if entry[-1].range() >= distance * 2:
+                    candidate = entry
+                    break
+                skipped.append(entry)
+
+            # Vehicles that could not take this ride keep their place
+            for entry in skipped:
+                heapq.heappush(heap, entry)
+
+            if candidate is None:
+                continue
+            if candidate[0] > now:
+                heapq.heappush(heap, candidate)
+                continue
+            if best is None or candidate < best:
+                if best is not None:
+                    heapq.heappush(self.buckets[best[2]], best)
+                best = candidate
+            else:
+                heapq.heappush(heap, candidate)
+
+        if best is None:
+            return None
+        return (best[3], best[-1])
+
+    def pop_after(self, now, low=0, high=math.inf):
+        """Remove and return (index, vehicle) for every vehicle with [low,
+        high) seats not available until after `now`."""
+        later = []
+        for pax, heap in self.buckets.items():
+            if not low <= pax < high:
+                continue
+            later += [(e[3], e[-1]) for e in heap if e[0] > now]
+            heap[:] = [e for e in heap if e[0] <= now]
+            heapq.heapify(heap)
+        return later
+
 
 @dataclass
 class Simulation:
@@ -156,13 +408,16 @@ class Simulation:
     charge_distance: float  # [km]
     charge_time_penalty: float  # [hr]
 
-    def run(self, args):
-        """Return a Result"""
+    def run(self, args, trace: TraceRecorder = None, timings: dict = None):
+        """Return a Result, recording each event to `trace` and adding the
+        seconds spent in each phase to `timings` if given"""
 
         ####################
         # Simulation Setup #
         ####################
+        clock = time.perf_counter() if timings is not None else 0
         (fleet, rides) = args
+        rides = rides.fresh()
 
         # Build a list of real vehicles for the simulation
         vehicles: list[RealVehicle] = []
@@ -170,57 +425,459 @@ class Simulation:
             for _ in range(q):
                 vehicles.append(RealVehicle(v))
 
+        # Plain lists are much faster than arrays to index one ride at a time
+        filled_time = rides.filled_time.tolist()
+        complete_time = rides.complete_time.tolist()
+
+        if timings is not None:
+            clock = _lap(timings, "copy", clock)
+
         ###################
         # Simulation Loop #
         ###################
-        for ride in rides:
+        dispatcher = Dispatcher(vehicles)
+        for r, (distance, passengers, start_time) in enumerate(
+            zip(
+                rides.distance.tolist(),
+                rides.passengers.tolist(),
+                rides.start_time.tolist(),
+            )
+        ):
 
             # Find the next available vehicle that meets the ride criteria
-            # Is this somehow messing it up?
-            vehicles = sorted(
-                vehicles,
-                key=lambda x: (
-                    x.next_available,
-                    x.battery_capacity,
-                    x.vehicle.chassis.pax,
+            entry = dispatcher.pop(passengers, distance)
+            if entry is None:
+                continue
+            (i, v) = entry
+
+            # Check if this ride will be filled within the max wait time
+            if v.next_available - start_time > self.max_wait:
+                # Drop the ride
+                complete_time[r] = -2
+                if trace is not None:
+                    trace.record(
+                        DROPPED, i, r, start_time, v.next_available, v.battery_capacity
+                    )
+                dispatcher.push(i, v)
+                continue
+
+            # One way travel time
+            travel_time = (distance / v.speed) + self.dwell_time
+
+            # Update ride parameters
+            filled_time[r] = max(start_time, v.next_available)
+            complete_time[r] = filled_time[r] + travel_time
+
+            # Update vehicle parameters
+            v.next_available = filled_time[r] + travel_time * 2  # Availability
+            v.move(distance * 2)  # Update the battery charge
+            if trace is not None:
+                trace.record(
+                    ASSIGNED, i, r, filled_time[r], v.next_available, v.battery_capacity
+                )
+            if v.range() <= self.charge_distance:
+                returned = v.next_available
+                v.next_available += v.charge_time() + self.charge_time_penalty
+                v.battery_capacity = v.capacity  # Reset the battery
+                if trace is not None:
+                    trace.record(
+                        CHARGING, i, r, returned, v.next_available, v.battery_capacity
+                    )
+            # Could make a decision to charge based on the availability of all other vehicles
+
+            dispatcher.push(i, v)
+
+        rides.filled_time = np.array(filled_time)
+        rides.complete_time = np.array(complete_time)
+        if timings is not None:
+            clock = _lap(timings, "simulate", clock)
+
+        ###################
+        # Analyze Results #
+        ###################
+        result = Result(rides, vehicles, fleet, self.availability)
+        if timings is not None:
+            _lap(timings, "result", clock)
+        return result
+
+    def run_batch(
+        self, vehicles: list[_Vehicle], quantities, rides: RideTable, timings=None
+    ):
+        """Return a Result for each quantity vector of the same vehicle designs.
+
+        Subclasses may simulate the variants together; this reference runs
+        them one at a time.
+        """
+        return [
+            self.run((Fleet(vehicles, list(q)), rides), timings=timings)
+            for q in quantities
+        ]
+
+
+# Events in the EventSimulation queue
+RETURNED = 0  # Vehicle is back at the hub
+CHARGED = 1  # Vehicle finished charging
+
+
+@dataclass
+class EventSimulation(Simulation):
+    """Discrete-event simulation with a finite pool of chargers at the hub.
+
+    Vehicle returns and charge completions are events in a heap, processed
+    in time order between ride requests. A request is filled at once by an
+    idle vehicle, otherwise it waits at the hub for the first vehicle that
+    can serve it and is dropped after the maximum wait. Vehicles that
+    return low on charge take a free charger or queue for one.
+
+    As in Simulation.run, a request is impossible when no vehicle has the
+    seats and, counting vehicles due to charge as full, the range for it.
+    With unlimited chargers the Results match Simulation.run to within
+    rounding (see parity_kernel.py).
+    """
+
+    chargers: float = math.inf  # Charging stations at the hub
+
+    def run(self, args, trace: TraceRecorder = None, timings: dict = None):
+        """Return a Result, recording each event to `trace` and adding the
+        seconds spent in each phase to `timings` if given"""
+
+        ####################
+        # Simulation Setup #
+        ####################
+        clock = time.perf_counter() if timings is not None else 0
+        (fleet, rides) = args
+        rides = rides.fresh()
+
+        vehicles: list[RealVehicle] = []
+        for v, q in zip(fleet.vehicles, fleet.quantities):
+            for _ in range(q):
+                vehicles.append(RealVehicle(v))
+
+        distance = rides.distance.tolist()
+        passengers = rides.passengers.tolist()
+        start = rides.start_time.tolist()
+        filled_time = rides.filled_time.tolist()
+        complete_time = rides.complete_time.tolist()
+
+        # Longest full-charge round trip for each passenger count
+        limit = {
+            p: max(
+                (
+                    v.capacity * 1000 / v.power_consumption
+                    for v in vehicles
+                    if v.pax >= p
                 ),
+                default=-math.inf,
+            )
+            for p in set(passengers)
+        }
+
+        idle = Dispatcher(vehicles)
+        waiting = {p: deque() for p in sorted(limit)}  # Ride indices
+        waiting_rides = 0
+        least = math.inf  # Fewest passengers of a waiting ride
+        events = []  # (time, event, vehicle index)
+        free = self.chargers  # Chargers not in use
+        unlimited = free == math.inf
+        queue = deque()  # Vehicles waiting for a charger
+        max_wait = self.max_wait
+        dwell_time = self.dwell_time
+        charge_distance = self.charge_distance
+        penalty = self.charge_time_penalty
+
+        # Range once any charge a vehicle is due for is done, as
+        # Simulation.run resets the battery as soon as a trip ends low
+        full = [v.capacity * 1000 / v.power_consumption for v in vehicles]
+        reaches = [
+            full[i] if v.range() <= charge_distance else v.range()
+            for i, v in enumerate(vehicles)
+        ]
+
+        # Max-heaps of (-reach, vehicle index) for each seat count. A trip
+        # lowers a vehicle's reach unless it leaves it due to charge, which
+        # raises it and pushes a new entry. Entries above a vehicle's reach
+        # are corrected when they reach the top, and those below are left
+        # over from before a charge and discarded.
+        by_seats = {}
+        for i, v in enumerate(vehicles):
+            by_seats.setdefault(v.pax, []).append((-reaches[i], i))
+        for heap in by_seats.values():
+            heapq.heapify(heap)
+        seats = sorted(by_seats, reverse=True)
+
+        # Round trips every vehicle with enough seats can reach, as they
+        # have at least the charging range or a full battery
+        short = {
+            p: min(
+                [charge_distance]
+                + [full[i] for i, v in enumerate(vehicles) if v.pax >= p]
             )
-            for v in vehicles:
-
-                # Check the vehicle has enough room and distance to complete the ride
-                if (
-                    ride.passengers <= v.vehicle.chassis.pax
-                    and v.range() >= ride.distance * 2
-                ):
-
-                    # Check if this ride will be filled within the max wait time
-                    if v.next_available - ride.start_time > self.max_wait:
-                        # Drop the ride
-                        ride.complete_time = -2
+            for p in limit
+        }
+
+        def reachable(p, d):
+            """Return True if a vehicle with at least p seats has reach d."""
+            if d <= short[p]:
+                return True
+            for s in seats:
+                if s < p:
+                    break
+                heap = by_seats[s]
+                while -heap[0][0] != reaches[heap[0][1]]:
+                    i = heap[0][1]
+                    if -heap[0][0] > reaches[i]:
+                        heapq.heapreplace(heap, (-reaches[i], i))
+                    else:
+                        heapq.heappop(heap)
+                if -heap[0][0] >= d:
+                    return True
+            return False
+
+        def least_waiting():
+            """Return the fewest passengers of a waiting ride."""
+            for p, rides_waiting in waiting.items():
+                if rides_waiting:
+                    return p
+            return math.inf
+
+        def assign(r, i, v, now):
+            travel_time = (distance[r] / v.speed) + dwell_time
+            filled_time[r] = now
+            complete_time[r] = now + travel_time
+            v.next_available = now + travel_time * 2
+            v.move(distance[r] * 2)
+            if trace is not None:
+                trace.record(ASSIGNED, i, r, now, v.next_available, v.battery_capacity)
+
+            remaining = v.range()
+            low = remaining <= charge_distance
+            if low:
+                reaches[i] = full[i]
+                heapq.heappush(by_seats[v.pax], (-full[i], i))
+            else:
+                reaches[i] = remaining
+
+            # The vehicle is idle from the time it is done unless a waiting
+            # ride may take it, or it may have to queue for a charger
+            if low and not unlimited:
+                heapq.heappush(events, (v.next_available, RETURNED, i))
+                return
+            event = RETURNED
+            if low:
+                # With unlimited chargers it charges as soon as it returns
+                returned = v.next_available
+                v.next_available = returned + v.charge_time() + penalty
+                v.battery_capacity = v.capacity  # Reset the battery
+                if trace is not None:
+                    trace.record(
+                        CHARGING, i, -1, returned, v.next_available, v.capacity
+                    )
+                event = CHARGED
+            if v.pax >= least:
+                heapq.heappush(events, (v.next_available, event, i))
+            else:
+                idle.push(i, v)
+
+        def process(now, event, i):
+            """Handle a vehicle returning or finishing its charge."""
+            nonlocal free, waiting_rides, least
+            v = vehicles[i]
+            if event == CHARGED:
+                v.battery_capacity = v.capacity  # Reset the battery
+                if queue:
+                    j = queue.popleft()
+                    u = vehicles[j]
+                    u.next_available = now + u.charge_time() + penalty
+                    heapq.heappush(events, (u.next_available, CHARGED, j))
+                    if trace is not None:
+                        trace.record(CHARGING, j, -1, now, u.next_available, u.capacity)
+                else:
+                    free += 1
+            elif v.range() <= charge_distance:
+                if free > 0:
+                    free -= 1
+                    v.next_available = now + v.charge_time() + penalty
+                    heapq.heappush(events, (v.next_available, CHARGED, i))
+                    if trace is not None:
+                        trace.record(CHARGING, i, -1, now, v.next_available, v.capacity)
+                else:
+                    queue.append(i)
+                    if trace is not None:
+                        trace.record(QUEUED, i, -1, now, math.nan, v.battery_capacity)
+                return
+
+            # Take the oldest waiting ride this vehicle can serve
+            if waiting_rides:
+                best = None
+                waited = waiting_rides
+                remaining = v.range()
+                for p, rides_waiting in waiting.items():
+                    if p > v.pax:
                         break
+                    while rides_waiting and now - start[rides_waiting[0]] > max_wait:
+                        r = rides_waiting.popleft()
+                        complete_time[r] = -2
+                        waiting_rides -= 1
+                        if trace is not None:
+                            trace.record(DROPPED, -1, r, start[r], now, math.nan)
+                    for k, r in enumerate(rides_waiting):
+                        if remaining >= distance[r] * 2:
+                            if best is None or r < best[0]:
+                                best = (r, p, k)
+                            break
+                if best is not None:
+                    (r, p, k) = best
+                    del waiting[p][k]
+                    waiting_rides -= 1
+                if waiting_rides != waited:
+                    least = least_waiting()
+                if best is not None:
+                    assign(r, i, v, now)
+                    return
+
+            v.next_available = now
+            idle.push(i, v)
+
+        if timings is not None:
+            clock = _lap(timings, "copy", clock)
 
-                    # One way travel time
-                    travel_time = (ride.distance / v.vehicle.speed()) + self.dwell_time
-
-                    # Update ride parameters
-                    ride.filled_time = max(ride.start_time, v.next_available)
-                    ride.complete_time = ride.filled_time + travel_time
-
-                    # Update vehicle parameters
-                    v.next_available = (
-                        ride.filled_time + travel_time * 2
-                    )  # Availability
-                    v.move(ride.distance * 2)  # Update the battery charge
-                    if v.range() <= self.charge_distance:
-                        v.next_available += v.charge_time() + self.charge_time_penalty
-                        v.battery_capacity = (
-                            v.vehicle.battery.capacity
-                        )  # Reset the battery
-                    # Could make a decision to charge based on the availability of all other vehicles
-
-                    break
+        ###################
+        # Simulation Loop #
+        ###################
+        for r, start_time in enumerate(start):
+            while events and events[0][0] <= start_time:
+                process(*heapq.heappop(events))
+
+            # No vehicle could ever take this ride
+            if distance[r] * 2 > limit[passengers[r]]:
+                continue
+
+            entry = idle.pop(passengers[r], distance[r], start_time)
+            if entry is None:
+                # As in Simulation.run, the ride is impossible if no vehicle
+                # has the range for it when it is requested
+                if reachable(passengers[r], distance[r] * 2):
+                    if passengers[r] < least:
+                        # Vehicles on their way back or charging that may
+                        # serve this ride return as events
+                        returning = idle.pop_after(start_time, passengers[r], least)
+                        for i, v in returning:
+                            heapq.heappush(events, (v.next_available, RETURNED, i))
+                        least = passengers[r]
+                    waiting[passengers[r]].append(r)
+                    waiting_rides += 1
+            else:
+                (i, v) = entry
+                assign(r, i, v, start_time)
+
+        # Serve the rides still waiting, then drop the rest
+        while events and waiting_rides:
+            process(*heapq.heappop(events))
+        for rides_waiting in waiting.values():
+            for r in rides_waiting:
+                complete_time[r] = -2
+                if trace is not None:
+                    trace.record(DROPPED, -1, r, start[r], math.nan, math.nan)
+
+        rides.filled_time = np.array(filled_time)
+        rides.complete_time = np.array(complete_time)
+        if timings is not None:
+            clock = _lap(timings, "simulate", clock)
 
         ###################
         # Analyze Results #
         ###################
-        return Result(rides, vehicles, fleet, self.availability)
+        result = Result(rides, vehicles, fleet, self.availability)
+        if timings is not None:
+            _lap(timings, "result", clock)
+        return result
+
+
+# Scenario installed in each worker process by install_scenario
+_scenario: tuple[Simulation, RideTable] = None
+
+
+def install_scenario(sim: Simulation, rides: RideTable):
+    """Pool initializer that installs the simulator and ride requests once per
+    worker so tasks only need to carry a Fleet."""
+    global _scenario
+    _scenario = (sim, rides)
+
+
+def run_fleet(fleet: Fleet):
+    """Return a Result for a fleet using the installed scenario."""
+    (sim, rides) = _scenario
+    return sim.run((fleet, rides))
+
+
+def group_variants(fleets: list[Fleet]):
+    """Return (vehicles, quantity vectors) batches of fleets that share the
+    same vehicle designs, for run_variants."""
+    groups = {}
+    for f in fleets:
+        key = tuple(v.design() for v in f.vehicles)
+        groups.setdefault(key, (f.vehicles, []))[1].append(f.quantities)
+    return list(groups.values())
+
+
+def window_variants(fleets, window=256):
+    """Yield the group_variants batches of fleets read `window` at a time,
+    so a sweep's fleets are never all held at once."""
+    fleets = iter(fleets)
+    while True:
+        chunk = list(itertools.islice(fleets, window))
+        if not chunk:
+            return
+        yield from group_variants(chunk)
+
+
+def run_variants(args):
+    """Return Results for a (vehicles, quantity vectors) batch of fleets
+    using the installed scenario."""
+    (vehicles, quantities) = args
+    (sim, rides) = _scenario
+    return sim.run_batch(vehicles, quantities, rides)
+
+
+# Seconds to pickle one Result, measured once in each worker process
+_pickle_time: float = None
+
+
+def _stamp(results: list[Result], timings: dict, start: float):
+    """Attach a task's timings to its first Result as `timings`. The Pool
+    pickles the Results after the task finishes, so pickling is estimated
+    from the worker's first task, which is pickled once more to time it."""
+    global _pickle_time
+    finish = time.time()
+    if _pickle_time is None:
+        clock = time.perf_counter()
+        pickle.dumps(results)
+        _pickle_time = (time.perf_counter() - clock) / len(results)
+    timings["pickle"] = _pickle_time * len(results)
+    results[0].timings = timings | {
+        "pid": os.getpid(),
+        "start": start,
+        "finish": finish,
+        "fleets": len(results),
+    }
+
+
+def run_fleet_timed(fleet: Fleet):
+    """run_fleet that also reports the worker's time in each phase."""
+    start = time.time()
+    timings = {}
+    (sim, rides) = _scenario
+    result = sim.run((fleet, rides), timings=timings)
+    _stamp([result], timings, start)
+    return result
+
+
+def run_variants_timed(args):
+    """run_variants that also reports the worker's time in each phase."""
+    start = time.time()
+    timings = {}
+    (vehicles, quantities) = args
+    (sim, rides) = _scenario
+    results = sim.run_batch(vehicles, quantities, rides, timings=timings)
+    _stamp(results, timings, start)
+    return results
@@ -1,10 +1,11 @@
 # Robaire Galliath
 # EM 411, Fall 2024
 
+import numpy as np
 from dataclasses import dataclass
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Battery:
     label: str
     capacity: float  # kWh
@@ -12,7 +13,7 @@ class Battery:
     weight: float  # kg
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Chassis:
     label: str
     pax: int
@@ -21,7 +22,7 @@ class Chassis:
     power: float  # Wh/km
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Charger:
     label: str
     power: float  # kW
@@ -29,7 +30,7 @@ class Charger:
     weight: float  # kg
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Motor:
     label: str
     weight: float  # kg
@@ -37,7 +38,7 @@ class Motor:
     cost: float  # $
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Autonomy:
     label: str
     level: str
@@ -140,13 +141,15 @@ class _Vehicle:
 
 
 class RoadVehicle(_Vehicle):
+    battery_ratio = 3  # Battery may not exceed 1/3 of the chassis weight
+    max_speed = 40  # [km/hr] (~25 mph)
 
     def __init__(self, c: Chassis, b: Battery, chrg: Charger, m: Motor, a: Autonomy):
 
         # Battery may not exceed more than 1/3 of the chassis
-        if b.weight > c.weight / 3:
+        if b.weight > c.weight / self.battery_ratio:
             raise ValueError(
-                f"Battery weight ({b.weight}) cannot exceed 1/3 chassis weight ({c.weight})."
+                f"Battery weight ({b.weight}) cannot exceed 1/{self.battery_ratio} chassis weight ({c.weight})."
             )
 
         super().__init__(c, b, chrg, m, a)
@@ -158,7 +161,7 @@ class RoadVehicle(_Vehicle):
     def speed(self):
         """Return the speed [km/hr]."""
         # speed is capped at 40 kph (~25 mph)
-        return min(700 * self.motor.power / self.total_weight(), 40)
+        return min(700 * self.motor.power / self.total_weight(), self.max_speed)
 
     def design(self):
         """Return a string describing the design vector."""
@@ -166,13 +169,15 @@ class RoadVehicle(_Vehicle):
 
 
 class Bicycle(_Vehicle):
+    battery_ratio = 2  # Battery may not exceed 1/2 of the chassis weight
+    max_speed = 15  # [km/hr] (~10 mph)
 
     def __init__(self, c: Chassis, b: Battery, chrg: Charger, m: Motor):
 
         # Battery may not exceed more than 1/2 of the chassis
-        if b.weight > c.weight / 2:
+        if b.weight > c.weight / self.battery_ratio:
             raise ValueError(
-                f"Battery weight ({b.weight}) cannot exceed 1/2 chassis weight ({c.weight})."
+                f"Battery weight ({b.weight}) cannot exceed 1/{self.battery_ratio} chassis weight ({c.weight})."
             )
 
         # A bicycle has level 4 autonomy included
@@ -185,13 +190,59 @@ class Bicycle(_Vehicle):
     def speed(self):
         """Return the speed [km/hr]."""
         # speed is capped at 15 kph (~10 mph)
-        return min(700 * self.motor.power / self.total_weight(), 15)
+        return min(700 * self.motor.power / self.total_weight(), self.max_speed)
 
     def design(self):
         """Return a string describing the design vector."""
         return f"{self.chassis.label}, {self.battery.label}, {self.charger.label}, {self.motor.label}"
 
 
+class VehicleBatch(_Vehicle):
+    """A batch of vehicle designs evaluated together.
+
+    Component fields are NumPy arrays with one element per design, so every
+    _Vehicle metric returns an array. Designs that break the battery weight
+    rule of `kind` are flagged in `valid` rather than raising.
+    """
+
+    kind: type[_Vehicle]
+    valid: np.ndarray
+
+    def __init__(
+        self,
+        kind: type[_Vehicle],
+        c: Chassis,
+        b: Battery,
+        chrg: Charger,
+        m: Motor,
+        a: Autonomy,
+    ):
+        super().__init__(c, b, chrg, m, a)
+        self.kind = kind
+        self.valid = np.asarray(b.weight <= c.weight / kind.battery_ratio)
+
+    def __len__(self):
+        return len(self.valid)
+
+    def speed(self):
+        """Return the speed [km/hr]."""
+        return np.minimum(
+            700 * self.motor.power / self.total_weight(), self.kind.max_speed
+        )
+
+    def design(self):
+        """Return an array of strings describing each design vector."""
+        labels = [self.chassis.label, self.battery.label, self.charger.label]
+        labels.append(self.motor.label)
+        if self.kind is not Bicycle:
+            labels.append(self.autonomy.label)
+
+        design = labels[0]
+        for label in labels[1:]:
+            design = np.char.add(np.char.add(design, ", "), label)
+        return design
+
+
 @dataclass
 class Fleet:
     vehicles: list[_Vehicle]